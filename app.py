@@ -1,16 +1,37 @@
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, session, flash, jsonify, Response, send_file
+from flask import Flask, Request, render_template, request, redirect, url_for, send_from_directory, session, flash, jsonify, Response, stream_with_context
 from config import Config
 import os
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from werkzeug.utils import secure_filename
 from flask_bcrypt import Bcrypt
 from simple_semantic import get_simple_search
-from knowledge_base import knowledge_base
-from sparql_search import semantic_search_service
-import base64, io
-from uuid import uuid4
+from bm25_search import get_bm25_search
+from semantic_search import get_vector_search
+from knowledge_base import get_knowledge_base
+from sparql_search import get_semantic_search_service
+from change_tracker import change_tracker
+from job_queue import get_job_queue
+from search_cache import get_search_cache, normalize_query
+from suggestion_index import query_popularity
+from image_pipeline import get_image_pipeline, normalize_image_path
+from image_store import get_image_store, UnsupportedImageError
+from image_cache import get_image_cache
+from startup import get_startup_report, init_jieba, prewarm, timed
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.dialects import mysql, sqlite
+import threading
+import json
+from werkzeug.security import safe_join
+class WeBookRequest(Request):
+    """上传的文件分块直接写入图片存储的临时文件（边写边计算哈希、校验文件头），不在内存中缓冲"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # 本应用只接收图片上传
+        return get_image_store().open_upload()
+
 app = Flask(__name__)
+app.request_class = WeBookRequest
 app.config.from_object(Config)
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 
@@ -18,49 +39,284 @@ db = SQLAlchemy(app)
 bcrypt = Bcrypt(app)
 migrate = Migrate(app, db)
 
-# 初始化简单语义搜索服务
-simple_search = get_simple_search()
+# 检索引擎（知识库、SPARQL搜索、简单语义搜索）和 jieba 词典都在第一次使用时才初始化，
+# 只导入 app 的命令行脚本不必承担这部分启动开销
 
 # 将数据库表创建放在模型定义之后
 
-def sync_database_to_knowledge_base():
-    """同步数据库数据到语义知识库"""
+def product_to_book_data(product):
+    """将Product对象转换为知识库使用的书籍数据"""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'description': product.description or '',
+        'price': float(product.price),
+        'degree_of_wear': product.degree_of_wear or 'unknown'
+    }
+
+def _kb_rebuild(products):
+    # 与数据库逐本核对，只重新分析新增或有变化的书籍（从快照启动时绝大多数书籍无需处理）
+    knowledge_base = get_knowledge_base()
+    knowledge_base.reconcile_books([product_to_book_data(product) for product in products])
+    if knowledge_base.store:
+        # 首次全量同步写入的都是变更日志，核对完立即生成快照
+        knowledge_base.store.compact(knowledge_base)
+
+def _kb_upsert(product):
+    get_knowledge_base().upsert_book_to_kb(product_to_book_data(product))
+
+def _kb_remove(product_id):
+    get_knowledge_base().remove_book_from_kb(product_id)
+
+def _simple_rebuild(products):
+    get_simple_search().build_index(products)
+
+def _simple_upsert(product):
+    get_simple_search().index_product(product)
+
+def _simple_remove(product_id):
+    get_simple_search().remove_product(product_id)
+
+def _bm25_rebuild(products):
+    get_bm25_search().build_index(products)
+
+def _bm25_upsert(product):
+    get_bm25_search().index_product(product)
+
+def _bm25_remove(product_id):
+    get_bm25_search().remove_product(product_id)
+
+def _vector_rebuild(products):
+    # 从磁盘加载的索引只需为新增或有变化的商品重新编码
+    get_vector_search().reconcile(products)
+
+def _vector_upsert(product):
+    schedule_vector_publish()
+
+def _vector_remove(product_id):
+    schedule_vector_publish()
+
+def schedule_vector_publish():
+    """
+    向量索引每次发布都要读入并重写整个索引文件，单本书籍的变化不立即发布：
+    延迟一段时间内的变化合并为同一个任务，与数据库核对后只重新编码变化的书籍、发布一次
+    """
+    get_job_queue().enqueue('publish_vector_index', 'all', delay=app.config['VECTOR_PUBLISH_DELAY'])
+
+# 需要随商品增删改同步的检索索引：名称 -> (显示名, 全量重建, 单本更新, 单本移除)
+PRODUCT_INDEXES = {
+    'knowledge_base': ('语义知识库', _kb_rebuild, _kb_upsert, _kb_remove),
+    'simple_search': ('语义搜索索引', _simple_rebuild, _simple_upsert, _simple_remove),
+    'bm25': ('BM25索引', _bm25_rebuild, _bm25_upsert, _bm25_remove),
+    'vector': ('向量索引', _vector_rebuild, _vector_upsert, _vector_remove),
+}
+
+# 语义搜索的排序方式：名称 -> (对应的索引, 获取搜索引擎的函数)
+SEMANTIC_RANKERS = {
+    'simple': ('simple_search', get_simple_search),
+    'bm25': ('bm25', get_bm25_search),
+    'vector': ('vector', get_vector_search),
+}
+
+# 结果取决于本进程内存索引的搜索方式（向量索引保存在共享文件中，知识库通过变更日志在进程间同步）
+PROCESS_LOCAL_SEARCH_MODES = {'semantic', 'simple', 'bm25'}
+
+def semantic_search_scores(query, top_k, ranker='simple'):
+    """同步对应索引后执行语义搜索，返回按分数排序的 {product_id: score}"""
+    index_name, get_engine = SEMANTIC_RANKERS[ranker]
+    sync_product_index(index_name)
+    return get_engine().search_scores(query, top_k=top_k)
+
+# 每个索引一把写锁：rdflib 内存图等结构不支持并发写入
+_index_locks = {name: threading.Lock() for name in PRODUCT_INDEXES}
+
+def sync_product_index(name, full=False):
+    """
+    将数据库中的商品同步到指定检索索引
+
+    首次调用（或 full=True）时全量重建，之后只同步变更跟踪器记录的增删改商品。
+    """
+    label, rebuild, upsert, remove = PRODUCT_INDEXES[name]
+    pending = set()
     try:
-        products = Product.query.all()
-        for product in products:
-            book_data = {
-                'id': product.id,
-                'name': product.name,
-                'description': product.description or '',
-                'price': float(product.price),
-                'degree_of_wear': product.degree_of_wear or 'unknown'
-            }
-            knowledge_base.add_book_to_kb(book_data)
-        
-        print(f"[OK] 已同步 {len(products)} 本书籍到语义知识库")
+        with _index_locks[name]:
+            if full:
+                change_tracker.reset(name)
+            pending = change_tracker.pending(name)
+            if pending is not None and not pending:
+                return True
+
+            if pending is None:
+                products = Product.query.all()
+                rebuild(products)
+            else:
+                products = Product.query.filter(Product.id.in_(pending)).all()
+                for product in products:
+                    upsert(product)
+
+                # 数据库中已不存在的商品，从索引中移除
+                existing_ids = {product.id for product in products}
+                for product_id in pending - existing_ids:
+                    remove(product_id)
+
+        if pending is None:
+            print(f"[OK] 已同步 {len(products)} 本书籍到{label}")
+        else:
+            print(f"[OK] 已增量同步 {len(pending)} 本书籍到{label}")
         return True
         
     except Exception as e:
-        print(f"[ERROR] 同步数据到知识库时出错: {e}")
+        change_tracker.requeue(name, pending)
+        print(f"[ERROR] 同步数据到{label}时出错: {e}")
         return False
 
-def convert_sparql_results_to_products(sparql_results):
-    """将SPARQL搜索结果转换为Product对象"""
-    products = []
+def sync_database_to_knowledge_base(full=False):
+    """同步数据库数据到语义知识库"""
+    knowledge_base = get_knowledge_base()
+    if knowledge_base.store:
+        # 先读取其他工作进程写入变更日志的修改
+        with _index_locks['knowledge_base']:
+            knowledge_base.store.catch_up(knowledge_base)
+    return sync_product_index('knowledge_base', full)
+
+def apply_product_change(product_id):
+    """
+    更新各检索索引中的单本书籍：商品存在则更新，不存在则移除；有索引更新失败时抛出异常以便重试
+
+    本进程还没有建立（首次全量同步）的索引直接跳过，建立时会从数据库读到这次修改
+    """
+    product = Product.query.get(product_id)
+    failed = []
+    for name, (label, rebuild, upsert, remove) in PRODUCT_INDEXES.items():
+        if not change_tracker.is_synced(name):
+            continue
+        try:
+            with _index_locks[name]:
+                if product:
+                    upsert(product)
+                else:
+                    remove(product_id)
+                # 已经处理过，无需在下次搜索时再同步
+                change_tracker.discard(name, product_id)
+        except Exception as e:
+            print(f"[ERROR] 更新{label}中的书籍 {product_id} 时出错: {e}")
+            failed.append(label)
+    if failed:
+        raise RuntimeError(f"更新{'、'.join(failed)}失败")
+
+def enqueue_product_change(product_id):
+    """
+    商品写入后提交后台任务更新检索索引，请求无需等待；同一商品未执行的任务会合并
+
+    任务只更新领取它的进程中的索引（内存中的索引各进程一份），
+    其他工作进程从共享变更日志读到这次修改，在下次搜索前增量同步
+    """
+    try:
+        get_job_queue().enqueue('product_index', product_id)
+    except Exception as e:
+        # 任务提交失败时索引仍会在下次搜索前按变更跟踪器增量同步
+        print(f"[ERROR] 提交书籍 {product_id} 的索引更新任务失败: {e}")
+
+def _run_product_index_job(key, payload):
+    with app.app_context():
+        apply_product_change(int(key))
+
+def _run_rebuild_vector_index_job(key, payload):
+    with app.app_context(), _index_locks['vector']:
+        get_vector_search().rebuild_index(Product.query.all())
+
+def _run_publish_vector_index_job(key, payload):
+    with app.app_context(), _index_locks['vector']:
+        get_vector_search().reconcile(Product.query.all())
+
+def _run_collect_image_job(key, payload):
+    with app.app_context():
+        blob = ImageBlob.query.get(key)
+        if blob is not None and blob.ref_count > 0:
+            # 回收前又被新的商品或订单引用
+            return
+        if not get_image_store().delete(key):
+            # 刚被重新上传过，宽限期后再检查
+            get_job_queue().enqueue('collect_image', key, delay=app.config['IMAGE_GC_GRACE'])
+            return
+        ImageBlob.query.filter(ImageBlob.path == key, ImageBlob.ref_count <= 0).delete()
+        db.session.commit()
+        print(f"[OK] 已回收不再被引用的图片 {key}")
+
+get_job_queue().register('product_index', _run_product_index_job)
+get_job_queue().register('rebuild_vector_index', _run_rebuild_vector_index_job)
+get_job_queue().register('publish_vector_index', _run_publish_vector_index_job)
+get_job_queue().register('collect_image', _run_collect_image_job)
+
+def load_products_in_order(product_ids):
+    """用一次 IN 查询批量取出商品，并按传入的ID顺序返回（不存在的ID跳过）"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+    products_by_id = {product.id: product for product in Product.query.filter(Product.id.in_(product_ids)).all()}
+    return [products_by_id[pid] for pid in product_ids if pid in products_by_id]
+
+def sparql_result_ids(sparql_results):
+    """取出SPARQL搜索结果中的商品ID，保持结果顺序并去重"""
+    product_ids = []
     for result in sparql_results:
         try:
-            product_id = int(result['id'])
-            product = Product.query.get(product_id)
-            if product:
-                products.append(product)
+            product_ids.append(int(result['id']))
         except (ValueError, TypeError):
             # 如果ID无效，跳过这个结果
             continue
-    
-    return products
+    return list(dict.fromkeys(product_ids))
+
+def convert_sparql_results_to_products(sparql_results):
+    """将SPARQL搜索结果转换为Product对象，保持SPARQL结果的排序"""
+    return load_products_in_order(sparql_result_ids(sparql_results))
+
+def search_product_ids(search_mode, query, limit=20):
+    """
+    按搜索方式查找商品，返回按相关度排序的 [[商品ID, 分数], ...]（关键词搜索分数为 None）
+
+    查询词先规范化，缓存键和实际搜索使用同一个字符串；结果按（搜索方式, 查询词, 数量）缓存，商品写入后失效
+    """
+    query = normalize_query(query)
+
+    def compute():
+        if search_mode == 'sparql':
+            sync_database_to_knowledge_base()  # 增量同步变更的商品到知识库
+            sparql_results = get_semantic_search_service().semantic_search(query, limit=limit)
+            return [[product_id, None] for product_id in sparql_result_ids(sparql_results)]
+        if search_mode != 'keyword':
+            ranker = 'simple' if search_mode == 'semantic' else search_mode
+            return [[product_id, score] for product_id, score in semantic_search_scores(query, limit, ranker).items()]
+        rows = db.session.query(Product.id).filter(
+            Product.name.ilike(f"%{query}%") | Product.description.ilike(f"%{query}%")
+        ).order_by(Product.id).all()
+        return [[row.id, None] for row in rows]
+
+    # 先读取其他工作进程的商品修改，有修改时本进程缓存的结果随即失效，不必等到过期
+    change_tracker.poll()
+    # 关键词搜索返回全部匹配，数量不参与缓存键；
+    # 简单语义搜索和BM25的索引只在本进程内存中，结果不放入多进程共享的缓存层
+    return get_search_cache().get_or_compute(search_mode, query, None if search_mode == 'keyword' else limit, compute,
+                                             shared=search_mode not in PROCESS_LOCAL_SEARCH_MODES)
+
+def product_to_dict(product):
+    """将Product对象转换为接口返回的字典"""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'description': product.description,
+        'degree_of_wear': product.degree_of_wear,
+        'image': product.image,
+        'seller_contact': product.seller_contact
+    }
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        # 首页按上传者查询商品、已售商品
+        db.Index('ix_products_user_id_is_sold', 'user_id', 'is_sold'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
     price = db.Column(db.Float, nullable=False)
@@ -106,6 +362,10 @@ class User(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # 首页订单列表、评价页待评价订单
+        db.Index('ix_orders_user_id_reviewed', 'user_id', 'reviewed'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, nullable=False)
     product_id = db.Column(db.Integer, nullable=False)
@@ -119,8 +379,12 @@ class Order(db.Model):
 
 class Review(db.Model):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        # 信用页、评价页按被评价者列出评价并按时间倒序
+        db.Index('ix_reviews_reviewee_id_created_at', 'reviewee_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, nullable=False)
+    order_id = db.Column(db.Integer, nullable=False, index=True)  # 重复评价检查
     reviewer_id = db.Column(db.Integer, nullable=False)  # 评价者ID（买家）
     reviewee_id = db.Column(db.Integer, nullable=False)  # 被评价者ID（卖家）
     rating = db.Column(db.Integer, nullable=False)  # 评分1-5星
@@ -128,12 +392,159 @@ class Review(db.Model):
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     is_anonymous = db.Column(db.Boolean, default=False)  # 是否匿名评价
 
+class UserRatingStats(db.Model):
+    """用户收到的评价汇总，提交评价时增量维护，页面展示无需重新统计全部评价"""
+    __tablename__ = 'user_rating_stats'
+    user_id = db.Column(db.Integer, primary_key=True)  # 被评价者ID
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    positive_count = db.Column(db.Integer, nullable=False, default=0)  # 4星及以上
+    star_1 = db.Column(db.Integer, nullable=False, default=0)
+    star_2 = db.Column(db.Integer, nullable=False, default=0)
+    star_3 = db.Column(db.Integer, nullable=False, default=0)
+    star_4 = db.Column(db.Integer, nullable=False, default=0)
+    star_5 = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.review_count if self.review_count else 0
+
+    @property
+    def positive_rate(self):
+        return (self.positive_count / self.review_count) * 100 if self.review_count else 100
+
+    def rating_count(self, rating):
+        return getattr(self, f'star_{rating}', 0) or 0
+
+    def rating_percentage(self, rating):
+        if not self.review_count:
+            return 0
+        return (self.rating_count(rating) / self.review_count) * 100
+
+    @classmethod
+    def empty(cls, user_id):
+        """还没有收到评价的用户的汇总（不加入会话，不写数据库）"""
+        return cls(user_id=user_id, review_count=0, rating_sum=0, positive_count=0,
+                   star_1=0, star_2=0, star_3=0, star_4=0, star_5=0)
+
+    @classmethod
+    def add_rating(cls, user_id, rating):
+        """
+        在当前事务中原子地累加一条评价：汇总行不存在时先插入（并发插入时忽略冲突），
+        再用SQL表达式更新，避免并发提交互相覆盖
+
+        Returns:
+            UserRatingStats: 累加后的汇总
+        """
+        table = cls.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'mysql':
+            ensure_row = mysql.insert(table).values(user_id=user_id).on_duplicate_key_update(user_id=table.c.user_id)
+        else:
+            ensure_row = sqlite.insert(table).values(user_id=user_id).on_conflict_do_nothing()
+        db.session.execute(ensure_row)
+
+        star_column = getattr(cls, f'star_{rating}')
+        cls.query.filter_by(user_id=user_id).update({
+            cls.review_count: cls.review_count + 1,
+            cls.rating_sum: cls.rating_sum + rating,
+            cls.positive_count: cls.positive_count + (1 if rating >= 4 else 0),
+            star_column: star_column + 1
+        }, synchronize_session=False)
+        return db.session.get(cls, user_id, populate_existing=True)
+
+class ImageBlob(db.Model):
+    """按内容寻址保存的图片，及其被商品、订单引用的次数（由下方的事件维护）"""
+    __tablename__ = 'image_blobs'
+    path = db.Column(db.String(200), primary_key=True)  # 相对 static 的 blob 路径
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+def _change_image_ref(connection, target, path, delta):
+    """在当前事务中调整 blob 的引用计数；旧的非 blob 路径不计数"""
+    if not path or not get_image_store().is_blob(path):
+        return
+    path = normalize_image_path(path)
+    table = ImageBlob.__table__
+    updated = connection.execute(
+        table.update().where(table.c.path == path).values(ref_count=table.c.ref_count + delta)
+    ).rowcount
+    if not updated and delta > 0:
+        connection.execute(table.insert().values(path=path, ref_count=delta))
+    if delta < 0:
+        # 提交后检查是否已无引用，由后台任务回收
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('released_images', set()).add(path)
+
+def _track_image_refs(model, attribute):
+    @event.listens_for(model, 'after_insert')
+    def image_ref_insert(mapper, connection, target):
+        _change_image_ref(connection, target, getattr(target, attribute), 1)
+
+    @event.listens_for(model, 'after_update')
+    def image_ref_update(mapper, connection, target):
+        history = sa_inspect(target).attrs[attribute].history
+        if history.has_changes():
+            for path in history.deleted:
+                _change_image_ref(connection, target, path, -1)
+            for path in history.added:
+                _change_image_ref(connection, target, path, 1)
+
+    @event.listens_for(model, 'after_delete')
+    def image_ref_delete(mapper, connection, target):
+        _change_image_ref(connection, target, getattr(target, attribute), -1)
+
+_track_image_refs(Product, 'image')
+_track_image_refs(Order, 'product_image')
+
+# 监听商品的增删改，记录到变更跟踪器，供知识库等索引增量同步
+@event.listens_for(Product, 'after_insert')
+@event.listens_for(Product, 'after_update')
+@event.listens_for(Product, 'after_delete')
+def track_product_change(mapper, connection, target):
+    get_image_cache().invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        # 刷新时只记下商品ID，提交后才记入变更跟踪器：回滚的修改不应触发索引同步
+        session.info.setdefault('changed_products', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_search_cache(session):
+    # 提交后才使搜索缓存失效：提交前缓存的结果可能基于旧数据
+    changed_products = session.info.pop('changed_products', None)
+    if changed_products:
+        change_tracker.mark_many(changed_products)
+        get_search_cache().bump_version()
+    for path in session.info.pop('released_images', ()):
+        try:
+            get_job_queue().enqueue('collect_image', path)
+        except Exception as e:
+            print(f"[ERROR] 提交图片 {path} 的回收任务失败: {e}")
+
+def invalidate_search_cache_for_remote_changes(product_ids):
+    # 其他工作进程提交的商品修改：共享层的版本号已由写入的进程递增，这里只需清空本进程缓存的结果
+    get_search_cache().bump_version(shared=False)
+
+change_tracker.subscribe(invalidate_search_cache_for_remote_changes)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_catalogue_change(session):
+    session.info.pop('changed_products', None)
+    session.info.pop('released_images', None)
+
 # 在应用上下文中创建数据库表（必须在模型定义之后）
 with app.app_context():
     db.create_all()
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+@app.template_global()
+def image_url(path, size='thumb', fmt='jpeg'):
+    """模板中引用指定尺寸的商品图片；派生图尚未生成时返回原图地址，没有图片时返回 None"""
+    rel_path = get_image_pipeline().image_url_path(path, size, fmt)
+    return url_for('static', filename=rel_path) if rel_path else None
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -182,9 +593,19 @@ def homepage():
     orders = Order.query.filter_by(user_id=user_id).all()
     return render_template('homepage.html', uploaded_products=uploaded_products, sold_products=sold_products, orders=orders)
 
+@app.errorhandler(UnsupportedImageError)
+def unsupported_image(e):
+    return jsonify({"message": str(e)}), 415
+
 @app.route('/upload', methods=['GET', 'POST'])
 def upload():
     if request.method == 'POST':
+        try:
+            # 解析表单时逐块写入图片，文件头不是图片时在读到开头几个字节后就中止
+            request.files
+        except UnsupportedImageError:
+            flash('Unsupported image file')
+            return redirect(url_for('upload'))
         name = request.form.get('name')
         price_str = request.form.get('price')
         if not price_str:
@@ -198,22 +619,22 @@ def upload():
 
         image_rel = None
         if image and allowed_file(image.filename):
-            # 生成唯一文件名，避免覆盖
-            original = secure_filename(image.filename)
-            unique_name = f"{uuid4().hex}_{original}"
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_name)
-            # 确保目录存在
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            image.save(save_path)
-            # 在数据库中仅存相对static的路径，使用正斜杠，便于通过url_for('static', filename=...)
-            image_rel = f"uploads/{unique_name}"
+            # 按内容的 SHA-256 保存，相同图片只存一份；数据库中存相对 static 的路径
+            try:
+                image_rel = get_image_store().save(image.stream)
+            except UnsupportedImageError:
+                flash('Unsupported image file')
+                return redirect(url_for('upload'))
 
         new_product = Product(name=name, price=price, description=description, degree_of_wear=degree_of_wear, image=image_rel or '', seller_contact=seller_contact, user_id=session.get('user_id'))
         db.session.add(new_product)
         db.session.commit()
         
-        # 添加到语义检索索引（简单版本无需额外操作）
-        # simple_search 直接搜索数据库，无需维护索引
+        # 后台更新语义检索索引
+        enqueue_product_change(new_product.id)
+        # 后台生成缩略图等派生图，生成之前页面引用原图
+        if image_rel:
+            get_image_pipeline().submit(image_rel)
         
         flash('Book uploaded successfully!')
         return redirect(url_for('homepage'))
@@ -234,24 +655,15 @@ def search():
             flash('请输入搜索关键词')
             return redirect(url_for('search'))
         
-        if search_mode == 'sparql':
-            # SPARQL语义知识图谱搜索
-            sync_database_to_knowledge_base()  # 同步数据到知识库
-            sparql_results = semantic_search_service.semantic_search(query, limit=20)
-            results = convert_sparql_results_to_products(sparql_results)
-            
-        elif search_mode == 'semantic':
-            # 简单语义搜索
-            all_products = Product.query.all()
-            search_results = simple_search.search(query, all_products, top_k=20)
-            if search_results:
-                product_ids = [pid for pid, score in search_results]
-                results = Product.query.filter(Product.id.in_(product_ids)).all()
-                # 按相似度排序
-                results = sorted(results, key=lambda p: next((score for pid, score in search_results if pid == p.id), 0), reverse=True)
-        else:
-            # 关键词搜索（默认）
-            results = Product.query.filter(Product.name.ilike(f"%{query}%") | Product.description.ilike(f"%{query}%")).all()
+        if search_mode not in ('sparql', 'semantic', 'bm25'):
+            search_mode = 'keyword'
+        # sparql：语义知识图谱搜索；semantic：简单语义搜索（基于倒排索引）；
+        # bm25：BM25 排序（基于稀疏矩阵）；keyword：关键词搜索（默认）
+        matches = search_product_ids(search_mode, query, limit=20)
+        # 记录搜索词热度，用于搜索建议排序
+        query_popularity.record(query)
+        # 搜索结果已按相关度排序，批量取出商品并保持该顺序
+        results = load_products_in_order(product_id for product_id, score in matches)
     
     return render_template('search.html', results=results, query=query, search_mode=search_mode)
 
@@ -270,21 +682,54 @@ def book_detail(id):
     current_time = datetime.now().strftime('%Y%m%d%H%M%S')
     return render_template('book_detail.html', product=product, seller=seller, current_time=current_time)
 
+# 内容寻址的图片内容永不改变，浏览器和代理可缓存一年且无需重新验证
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def send_image(rel_path, max_age=None, immutable=None):
+    """
+    发送 static 目录下的图片，以内容的 SHA-256 作为强 ETag，If-None-Match 匹配时返回 304
+
+    内容寻址的路径（blob 及其派生图）长期缓存并标记 immutable；其他路径缓存 max_age 秒，过期后凭 ETag 重新验证。
+    immutable=False 用于内容可能变化的地址（如按商品ID访问的图片）
+    """
+    rel_path = normalize_image_path(rel_path)
+    file_path = safe_join('static', rel_path)
+    if file_path is None or not os.path.isfile(file_path):
+        return "No image available", 404
+    store = get_image_store()
+    # blob 的文件名就是内容哈希，无需读取文件
+    etag = store.blob_digest(rel_path) or get_image_cache().file_digest(file_path)
+    if immutable is None:
+        immutable = store.is_content_addressed(rel_path)
+    response = send_from_directory('static', rel_path, etag=etag,
+                                   max_age=IMMUTABLE_MAX_AGE if immutable else max_age)
+    if immutable:
+        response.cache_control.immutable = True
+    elif not max_age:
+        # 每次使用前都向服务器验证（命中 ETag 时只返回 304）
+        response.cache_control.no_cache = True
+    return response
+
+def _load_product_image(product_id):
+    image = db.session.query(Product.image).filter(Product.id == product_id).scalar()
+    return normalize_image_path(image) or None
+
 @app.route('/image/<int:product_id>')
 def get_image(product_id):
-    # 兼容历史：若数据库保存了相对路径（推荐），则转为通过static服务；
-    # 若未来保存为base64，可在此分支处理，但当前实现仅支持路径方式。
-    product = Product.query.get(product_id)
-    if not product or not product.image:
+    # 商品的图片可能被修改，该地址不做长期缓存；商品ID -> 图片路径走进程内缓存，热门封面无需查询数据库
+    rel_path = get_image_cache().product_image(product_id, _load_product_image)
+    if not rel_path:
         return "No image available", 404
+    return send_image(rel_path, max_age=0, immutable=False)
 
-    rel_path = product.image.replace('\\', '/')
-    # 移除可能存在的前缀"static/"
-    if rel_path.startswith('static/'):
-        rel_path = rel_path[len('static/'):]
+@app.route('/static/blobs/<path:filename>')
+def blob_file(filename):
+    # 比 Flask 内置的 static 路由更具体，url_for('static', ...) 生成的 blob 地址由这里处理
+    return send_image(f'blobs/{filename}')
 
-    # 通过静态目录发送文件
-    return send_from_directory('static', rel_path)
+@app.route('/static/derived/<path:filename>')
+def derived_file(filename):
+    return send_image(f'derived/{filename}', max_age=app.config['IMAGE_MAX_AGE'])
   
 @app.route('/check_data')
 def check_data():
@@ -299,7 +744,7 @@ def book_details(id):
     db.session.delete(product)
     db.session.commit()
     
-    # 简单版本无需索引维护
+    enqueue_product_change(id)
     
     return "delete successfully!"
 
@@ -311,7 +756,7 @@ def login_success():
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return send_image(f'uploads/{filename}', max_age=app.config['IMAGE_MAX_AGE'])
 
 @app.route('/products/<int:product_id>', methods=['DELETE'])
 def delete_product(product_id):
@@ -320,35 +765,65 @@ def delete_product(product_id):
         return jsonify({"message": "Product not found"}), 404
     db.session.delete(product)
     db.session.commit()
+    enqueue_product_change(product_id)
     return jsonify({"message": "Product deleted successfully"}), 200
 
 @app.route('/products', methods=['GET'])
 def get_products():
-    products = Product.query.all()
-    return jsonify([{
-        'id': product.id,
-        'description': product.description,
-        'price': product.price,
-        'degree_of_wear': product.degree_of_wear,
-        'image': product.image,
-        'name': product.name,
-        'seller_contact': product.seller_contact
-    } for product in products])
+    """
+    商品列表
+
+    - 不带参数：返回全部商品列表（兼容旧客户端）
+    - limit / after：按ID做游标分页，返回 {"items": [...], "next_after": 下一页游标}
+    - format=ndjson：以每行一个JSON对象的方式流式返回，服务端分批读取，不一次性加载全表
+    """
+    after = request.args.get('after')
+    limit = request.args.get('limit')
+    try:
+        after = int(after) if after is not None else None
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return jsonify({"message": "Invalid pagination parameters"}), 400
+    if limit is not None and limit <= 0:
+        return jsonify({"message": "limit must be positive"}), 400
+
+    query = Product.query.order_by(Product.id)
+    if after is not None:
+        query = query.filter(Product.id > after)
+
+    if request.args.get('format') == 'ndjson':
+        if limit is not None:
+            query = query.limit(limit)
+
+        def generate():
+            for product in query.yield_per(app.config['PRODUCTS_STREAM_BATCH_SIZE']):
+                yield json.dumps(product_to_dict(product), ensure_ascii=False) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    if limit is None and after is None:
+        response = jsonify([product_to_dict(product) for product in query.all()])
+    else:
+        limit = min(limit or app.config['PRODUCTS_PAGE_SIZE'], app.config['PRODUCTS_MAX_PAGE_SIZE'])
+        # 多取一条用来判断是否还有下一页
+        products = query.limit(limit + 1).all()
+        has_more = len(products) > limit
+        products = products[:limit]
+        response = jsonify({
+            'items': [product_to_dict(product) for product in products],
+            'next_after': products[-1].id if has_more else None
+        })
+
+    # 根据响应内容生成ETag，客户端带 If-None-Match 且内容未变时返回304
+    response.add_etag()
+    return response.make_conditional(request)
 
 @app.route('/products/<int:product_id>', methods=['GET'])
 def get_product(product_id):
     product = Product.query.get(product_id)
     if product is None:
         return jsonify({"message": "Product not found"}), 404
-    return jsonify({
-        'id': product.id,
-        'name': product.name,
-        'price': product.price,
-        'description': product.description,
-        'degree_of_wear': product.degree_of_wear,
-        'image': product.image,
-        'seller_contact': product.seller_contact
-    })
+    return jsonify(product_to_dict(product))
 
 @app.route('/products/<int:product_id>', methods=['PUT'])
 def update_product(product_id):
@@ -369,6 +844,7 @@ def update_product(product_id):
         product.seller_contact = data['seller_contact']
     
     db.session.commit()
+    enqueue_product_change(product_id)
     return jsonify({"message": "Product updated successfully"})
 
 @app.route('/order/<int:order_id>', methods=['GET'])
@@ -425,43 +901,89 @@ def create_order():
 
 @app.route('/api/rebuild_index', methods=['POST'])
 def rebuild_index():
-    """重建索引（简单版本无需操作）"""
+    """提交后台任务：重新编码全部商品，重建向量索引"""
     try:
-        products = Product.query.all()
+        if not get_vector_search().available:
+            return jsonify({"error": "Vector search is unavailable"}), 503
+        job_id = get_job_queue().enqueue('rebuild_vector_index', 'all')
         return jsonify({
-            "message": "简单版本无需重建索引",
-            "total_products": len(products)
-        }), 200
+            "message": "向量索引重建任务已提交",
+            "job_id": job_id,
+            "status_url": url_for('job_status', job_id=job_id)
+        }), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/search_cache/stats')
+def search_cache_stats():
+    """搜索结果缓存统计：命中/未命中次数、命中率、当前目录版本号"""
+    return jsonify(get_search_cache().get_stats())
+
+
+@app.route('/api/image_cache/stats')
+def image_cache_stats():
+    """图片查找缓存统计"""
+    return jsonify(get_image_cache().get_stats())
+
+@app.route('/api/db_pool/stats')
+def db_pool_stats():
+    """数据库连接池统计：借出连接数、等待连接的时间、超时次数等"""
+    pool = db.engine.pool
+    stats = pool.get_stats() if hasattr(pool, 'get_stats') else {'status': pool.status()}
+    stats['profile'] = app.config['DB_POOL_PROFILE']
+    return jsonify(stats)
+
+@app.route('/api/jobs')
+def job_stats():
+    """后台任务队列状态：各状态任务数、最早未执行任务的等待时间、最近失败的任务"""
+    return jsonify(get_job_queue().get_stats())
+
+
+@app.route('/api/jobs/<int:job_id>')
+def job_status(job_id):
+    """单个后台任务的状态"""
+    job = get_job_queue().get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
 @app.route('/api/semantic_search', methods=['POST'])
 def api_semantic_search():
-    """简单语义搜索API"""
+    """语义搜索API"""
     try:
         data = request.get_json()
         query = data.get('query', '')
         top_k = data.get('top_k', 10)
+        # 排序方式：vector（向量近似最近邻）、simple（倒排索引 + 相似度）或 bm25；
+        # 未指定时优先使用向量检索，模型或 faiss 不可用时退回 simple
+        mode = data.get('mode')
         
         if not query:
             return jsonify({"error": "The query cannot be empty"}), 400
+        if not isinstance(top_k, int) or isinstance(top_k, bool) or top_k <= 0:
+            return jsonify({"error": "top_k must be a positive integer"}), 400
+        if mode is None:
+            mode = 'vector' if get_vector_search().available else 'simple'
+        if mode not in SEMANTIC_RANKERS:
+            return jsonify({"error": f"Unsupported mode: {mode}"}), 400
+        if mode == 'vector' and not get_vector_search().available:
+            return jsonify({"error": "Vector search is unavailable"}), 503
         
-        # 执行简单语义搜索
-        all_products = Product.query.all()
-        search_results = simple_search.search(query, all_products, top_k=top_k)
+        # 执行语义搜索（simple 模式在缓存中与搜索页的 semantic 共用条目）
+        scores = dict(search_product_ids('semantic' if mode == 'simple' else mode, query, limit=top_k))
         
-        if not search_results:
-            return jsonify({"results": []}), 200
+        if not scores:
+            return jsonify({"results": [], "mode": mode}), 200
         
-        # 获取商品详情
-        product_ids = [pid for pid, score in search_results]
-        products = Product.query.filter(Product.id.in_(product_ids)).all()
+        # 获取商品详情（一次查询批量取出，顺序即相似度顺序）
+        products = load_products_in_order(scores)
         
         # 构建结果
         results = []
         for product in products:
-            score = next((s for pid, s in search_results if pid == product.id), 0)
+            score = scores[product.id]
             results.append({
                 'id': product.id,
                 'name': product.name,
@@ -472,10 +994,7 @@ def api_semantic_search():
                 'similarity_score': score
             })
         
-        # 按相似度排序
-        results = sorted(results, key=lambda x: x['similarity_score'], reverse=True)
-        
-        return jsonify({"results": results}), 200
+        return jsonify({"results": results, "mode": mode}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -484,7 +1003,7 @@ def api_semantic_search():
 @app.route('/kb/sync')
 def sync_kb():
     """手动同步知识库"""
-    if sync_database_to_knowledge_base():
+    if sync_database_to_knowledge_base(full=True):
         flash('✅ 知识库同步完成')
     else:
         flash('❌ 知识库同步失败')
@@ -494,7 +1013,7 @@ def sync_kb():
 def kb_stats():
     """显示知识库统计信息"""
     try:
-        stats = knowledge_base.get_stats()
+        stats = get_knowledge_base().get_stats()
         return render_template('kb_stats.html', stats=stats)
     except Exception as e:
         flash(f'获取知识库统计信息失败: {e}')
@@ -508,7 +1027,9 @@ def search_suggestions():
         return jsonify([])
     
     try:
-        suggestions = semantic_search_service.get_search_suggestions(query)
+        # 增量同步后书名、关键词的变化即可出现在建议中
+        sync_database_to_knowledge_base()
+        suggestions = get_semantic_search_service().get_search_suggestions(query)
         return jsonify(suggestions)
     except Exception as e:
         print(f"获取搜索建议失败: {e}")
@@ -516,24 +1037,56 @@ def search_suggestions():
 
 @app.route('/api/book_recommendations/<int:book_id>')
 def book_recommendations(book_id):
-    """书籍推荐API"""
+    """书籍推荐API，传入 include_products=1 时附带数据库中的商品信息"""
     try:
-        recommendations = semantic_search_service.get_recommendations_by_book_id(str(book_id))
+        sync_database_to_knowledge_base()
+        recommendations = get_semantic_search_service().get_recommendations_by_book_id(str(book_id))
+        if request.args.get('include_products') in ('1', 'true'):
+            products = {product.id: product for product in convert_sparql_results_to_products(recommendations)}
+            for recommendation in recommendations:
+                product = products.get(int(recommendation['id']))
+                recommendation['product'] = product_to_dict(product) if product else None
         return jsonify(recommendations)
     except Exception as e:
         print(f"获取推荐失败: {e}")
         return jsonify([])
 
 # 辅助函数
-def get_user_email(user_id):
-    """获取用户邮箱"""
-    user = User.query.get(user_id)
-    return user.email if user else 'Unknown'
+def load_reviewers(reviews):
+    """用一次 IN 查询取出评价者，返回 {用户ID: User}；匿名评价不需要评价者信息"""
+    reviewer_ids = {review.reviewer_id for review in reviews if not review.is_anonymous}
+    if not reviewer_ids:
+        return {}
+    return {user.id: user for user in User.query.filter(User.id.in_(reviewer_ids)).all()}
 
-def get_user_credit_level(user_id):
-    """获取用户信用等级"""
-    user = User.query.get(user_id)
-    return user.credit_level if user else 'Unknown'
+def get_rating_stats(user_id):
+    """获取用户的评价汇总（只读）；还没有收到评价的用户返回全为 0 的汇总，汇总行在提交第一条评价时创建"""
+    return UserRatingStats.query.get(user_id) or UserRatingStats.empty(user_id)
+
+def get_review_page(user_id, before=None, limit=None):
+    """
+    按 (created_at, id) 倒序分页获取用户收到的评价
+
+    Args:
+        user_id: 被评价者ID
+        before: 上一页最后一条评价的ID，作为游标；为空时取第一页
+        limit: 每页数量
+
+    Returns:
+        tuple: (评价列表, 下一页游标；没有更多时为 None)
+    """
+    limit = min(limit or app.config['REVIEWS_PAGE_SIZE'], app.config['REVIEWS_MAX_PAGE_SIZE'])
+    query = Review.query.filter(Review.reviewee_id == user_id)
+    if before is not None:
+        # 游标行的时间直接在数据库里取，避免时间格式转换带来的比较误差
+        anchor = db.session.query(Review.created_at).filter(Review.id == before).scalar_subquery()
+        query = query.filter(db.or_(Review.created_at < anchor,
+                                    db.and_(Review.created_at == anchor, Review.id < before)))
+    # 多取一条用来判断是否还有下一页
+    reviews = query.order_by(Review.created_at.desc(), Review.id.desc()).limit(limit + 1).all()
+    has_more = len(reviews) > limit
+    reviews = reviews[:limit]
+    return reviews, (reviews[-1].id if has_more else None)
 
 def format_date(dt):
     """格式化日期"""
@@ -553,21 +1106,12 @@ def credit(user_id):
         flash('User not found')
         return redirect(url_for('homepage'))
     
-    # 获取评价
-    reviews = Review.query.filter_by(reviewee_id=user_id).order_by(Review.created_at.desc()).all()
-    review_count = len(reviews)
+    # 评价数量取自评价汇总
+    stats = get_rating_stats(user_id)
+    review_count = stats.review_count
     
     # 获取最近5条评价
-    recent_reviews = reviews[:5]
-    
-    # 计算好评率
-    if review_count > 0:
-        avg_rating = sum(r.rating for r in reviews) / review_count
-        positive_count = sum(1 for r in reviews if r.rating >= 4)
-        positive_rate = (positive_count / review_count) * 100
-    else:
-        avg_rating = 0
-        positive_rate = 100
+    recent_reviews = Review.query.filter_by(reviewee_id=user_id).order_by(Review.created_at.desc()).limit(5).all()
     
     # 模拟信用历史（实际项目中可以存储真实历史）
     credit_history = [
@@ -581,7 +1125,7 @@ def credit(user_id):
                            review_count=review_count,
                            recent_reviews=recent_reviews,
                            credit_history=credit_history,
-                           get_user_email=get_user_email,
+                           reviewers=load_reviewers(recent_reviews),
                            format_date=format_date)
 
 # 评价页面路由
@@ -596,14 +1140,11 @@ def reviews(user_id):
     current_user_id = session.get('user_id')
     is_current_user = current_user_id == user_id
     
-    # 获取所有评价
-    reviews = Review.query.filter_by(reviewee_id=user_id).order_by(Review.created_at.desc()).all()
+    # 只取第一页评价，后续页面通过 /api/reviews 滚动加载
+    reviews, next_before = get_review_page(user_id)
     
-    # 计算平均评分
-    if reviews:
-        average_rating = sum(r.rating for r in reviews) / len(reviews)
-    else:
-        average_rating = 0
+    # 平均评分和各星级数量取自评价汇总
+    stats = get_rating_stats(user_id)
     
     # 获取待评价订单（只有当前用户查看自己页面时显示）
     pending_orders = []
@@ -611,31 +1152,47 @@ def reviews(user_id):
         # 获取已完成但未评价的订单（这里简化为已支付的订单）
         pending_orders = Order.query.filter_by(user_id=current_user_id, reviewed=False).all()
     
-    # 获取各星级数量
-    rating_counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-    for review in reviews:
-        if review.rating in rating_counts:
-            rating_counts[review.rating] += 1
-    
-    def get_rating_count(rating):
-        return rating_counts.get(rating, 0)
-    
-    def get_rating_percentage(rating):
-        if len(reviews) == 0:
-            return 0
-        return (rating_counts.get(rating, 0) / len(reviews)) * 100
-    
     return render_template('reviews.html',
                            user=user,
                            reviews=reviews,
-                           average_rating=average_rating,
+                           next_before=next_before,
+                           review_count=stats.review_count,
+                           average_rating=stats.average_rating,
                            is_current_user=is_current_user,
                            pending_orders=pending_orders,
-                           get_user_email=get_user_email,
-                           get_user_credit_level=get_user_credit_level,
+                           reviewers=load_reviewers(reviews),
                            format_date=format_date,
-                           get_rating_count=get_rating_count,
-                           get_rating_percentage=get_rating_percentage)
+                           get_rating_count=stats.rating_count,
+                           get_rating_percentage=stats.rating_percentage)
+
+@app.route('/api/reviews/<int:user_id>')
+def api_reviews(user_id):
+    """评价分页API，供评价页滚动加载"""
+    before = request.args.get('before')
+    limit = request.args.get('limit')
+    try:
+        before = int(before) if before is not None else None
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return jsonify({"message": "Invalid pagination parameters"}), 400
+    if limit is not None and limit <= 0:
+        return jsonify({"message": "limit must be positive"}), 400
+
+    reviews, next_before = get_review_page(user_id, before, limit)
+    reviewers = load_reviewers(reviews)
+    results = []
+    for review in reviews:
+        reviewer = reviewers.get(review.reviewer_id)
+        results.append({
+            'id': review.id,
+            'rating': review.rating,
+            'comment': review.comment,
+            'created_at': format_date(review.created_at),
+            'is_anonymous': review.is_anonymous,
+            'reviewer_email': None if review.is_anonymous else (reviewer.email if reviewer else 'Unknown'),
+            'reviewer_credit_level': None if review.is_anonymous else (reviewer.credit_level if reviewer else 'Unknown')
+        })
+    return jsonify({"reviews": results, "next_before": next_before})
 
 # 提交评价路由
 @app.route('/submit_review', methods=['POST'])
@@ -655,6 +1212,13 @@ def submit_review():
     if not order_id or not rating:
         return jsonify({"success": False, "message": "Missing required fields"}), 400
     
+    try:
+        rating = int(rating)
+    except (TypeError, ValueError):
+        rating = 0
+    if not 1 <= rating <= 5:
+        return jsonify({"success": False, "message": "Rating must be between 1 and 5"}), 400
+    
     # 获取订单信息
     order = Order.query.get(order_id)
     if not order:
@@ -670,6 +1234,8 @@ def submit_review():
     if existing_review:
         return jsonify({"success": False, "message": "Already reviewed"}), 400
     
+    seller = User.query.get(product.user_id)
+    
     # 创建评价
     new_review = Review(
         order_id=order_id,
@@ -686,7 +1252,6 @@ def submit_review():
     order.reviewed = True
     
     # 更新卖家信用
-    seller = User.query.get(product.user_id)
     if seller:
         # 更新交易次数
         seller.total_trades += 1
@@ -702,16 +1267,48 @@ def submit_review():
         # 更新信用等级
         seller.update_credit_level()
         
-        # 更新好评率
-        seller_reviews = Review.query.filter_by(reviewee_id=seller.id).all()
-        if seller_reviews:
-            positive_count = sum(1 for r in seller_reviews if r.rating >= 4)
-            seller.positive_rates = (positive_count / len(seller_reviews)) * 100
+        # 增量更新评价汇总和好评率（汇总行不存在时创建），与评价在同一事务中提交
+        stats = UserRatingStats.add_rating(seller.id, rating)
+        seller.positive_rates = stats.positive_rate
     
     db.session.commit()
     
     return jsonify({"success": True, "message": "Review submitted successfully"})
 
+def prewarm_search_engines(background=True):
+    """预热检索引擎：加载 jieba 词典、构建知识库和搜索服务，并完成首次索引同步"""
+    def sync_indexes():
+        with timed('index_sync'), app.app_context():
+            sync_database_to_knowledge_base()
+            sync_product_index('simple_search')
+            sync_product_index('bm25')
+            sync_product_index('vector')
+
+    return prewarm([
+        ('jieba', init_jieba),
+        ('knowledge_base', get_knowledge_base),
+        ('semantic_search_service', get_semantic_search_service),
+        ('simple_search', get_simple_search),
+        ('bm25_search', get_bm25_search),
+        ('vector_search', get_vector_search),
+        ('index_sync', sync_indexes),
+        # 继续执行上次退出时尚未完成的后台任务
+        ('job_worker', get_job_queue().start_worker),
+    ], background=background)
+
+@app.route('/api/startup_report')
+def startup_report():
+    """启动耗时报告：各检索组件的初始化耗时"""
+    return jsonify(get_startup_report())
+
+# 直接运行 app.py 时使用 debug 重载器：父进程只负责监视文件变化并重启子进程，
+# 处理请求的是设置了 WERKZEUG_RUN_MAIN=true 的子进程，只在子进程中预热
+_reloader_parent = __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+
+# 按配置在后台线程中预热检索引擎
+if app.config['SEARCH_PREWARM'] and not _reloader_parent:
+    prewarm_search_engines()
+
 if __name__ == '__main__':
     if not os.path.exists(app.config['UPLOAD_FOLDER']):
         os.makedirs(app.config['UPLOAD_FOLDER'])
@@ -720,5 +1317,7 @@ if __name__ == '__main__':
     print(f"[INFO] 数据库URI: {app.config.get('SQLALCHEMY_DATABASE_URI')}")
     print(f"[INFO] 上传文件夹: {app.config['UPLOAD_FOLDER']}")
     print(f"[INFO] 语义知识库: 已集成SPARQL搜索")
+    if not app.config['SEARCH_PREWARM'] and not _reloader_parent:
+        prewarm_search_engines()
     print("[INFO] 访问地址: http://127.0.0.1:5003")
     app.run(debug=True, port=5003)
@@ -0,0 +1,224 @@
+"""
+BM25 排序模块
+用 SciPy 稀疏矩阵保存全部商品的 BM25 词权重，
+一次查询只需一次稀疏矩阵与向量的乘法，再用 argpartition 取前 top_k；
+商品增删改只更新对应的行，不重建整个矩阵
+NumPy/SciPy 在用到时才导入（与 faiss 一样），导入 app 时不加载
+"""
+import threading
+from collections import Counter
+
+from token_cache import get_token_cache
+from simple_semantic import get_simple_search, iter_index_terms
+from startup import timed
+
+
+class BM25Search:
+    """基于稀疏矩阵的 BM25 搜索引擎
+
+    矩阵中保存每个（商品, 词）权重中与词频、文档长度有关的部分，IDF 在查询时按当前文档频率乘到查询向量上。
+    单本商品变化时只改动对应的行：旧行原地清零，新行放进一个小的增量矩阵，
+    增量行累计较多后再用稀疏矩阵运算与主矩阵合并，不在请求中逐个商品重建整个矩阵。
+    新写入的行按写入时的平均文档长度计算，全量重建时统一。
+    """
+
+    def __init__(self, k1=1.5, b=0.75, synonym_weight=0.5, merge_ratio=0.1, merge_min_rows=256):
+        import numpy as np
+        self.k1 = k1
+        self.b = b
+        # 同义词扩展出来的词在查询向量中的权重（原始查询词为1）
+        self.synonym_weight = synonym_weight
+        # 增量行超过 max(merge_min_rows, 主矩阵有效行数 × merge_ratio) 时合并进主矩阵
+        self.merge_ratio = merge_ratio
+        self.merge_min_rows = merge_min_rows
+        # 商品ID -> 词频
+        self.documents = {}
+        # 词 -> 包含该词的商品数；全部商品的总词数
+        self._doc_freq = Counter()
+        self._total_length = 0
+        self._lock = threading.RLock()
+        # 词 -> 列号，只增不减，全量重建时重新编号
+        self._vocabulary = {}
+        # 主矩阵、每行对应的商品ID，以及 商品ID -> 行号（已清零的行不在其中）；由 _build_matrix 生成
+        self._matrix = None
+        self._row_ids = np.zeros(0, dtype=np.int64)
+        self._rows = {}
+        # 增量行：商品ID -> (列号, 权重)，以及由它们生成的增量矩阵（有变化后置空，下次搜索时生成）
+        self._delta = {}
+        self._delta_matrix = None
+        self._delta_ids = np.zeros(0, dtype=np.int64)
+
+    def analyze(self, text, key=None):
+        """分词并取出检索词（与简单语义搜索的倒排索引同一规则），保留重复以便统计词频"""
+        return list(iter_index_terms(get_token_cache().lcut(text.lower(), key)))
+
+    def _product_terms(self, product):
+        return Counter(self.analyze(f"{product.name} {product.description}", key=product.id))
+
+    def _add_document(self, product_id, counts):
+        self.documents[product_id] = counts
+        self._doc_freq.update(counts.keys())
+        self._total_length += sum(counts.values())
+
+    def _remove_document(self, product_id):
+        counts = self.documents.pop(product_id, None)
+        if counts is None:
+            return
+        self._doc_freq.subtract(counts.keys())
+        for term in counts:
+            if self._doc_freq[term] <= 0:
+                del self._doc_freq[term]
+        self._total_length -= sum(counts.values())
+        row = self._rows.pop(product_id, None)
+        if row is not None:
+            # 原地清零该行，分数为 0 的行不会出现在结果中
+            self._matrix.data[self._matrix.indptr[row]:self._matrix.indptr[row + 1]] = 0
+        if self._delta.pop(product_id, None) is not None:
+            self._delta_matrix = None
+
+    def _row_weights(self, counts):
+        """一个商品的列号和权重（不含 IDF）；新词加入词表"""
+        import numpy as np
+        length = sum(counts.values())
+        avg_length = self._total_length / len(self.documents) if self.documents else 0.0
+        cols = np.fromiter((self._vocabulary.setdefault(term, len(self._vocabulary)) for term in counts),
+                           dtype=np.int32, count=len(counts))
+        tfs = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        norm = self.k1 * (1 - self.b + self.b * length / (avg_length or 1.0))
+        return cols, tfs * (self.k1 + 1) / (tfs + norm)
+
+    def _csr(self, rows):
+        """由 [(列号, 权重), ...] 生成 行数 × 当前词表大小 的稀疏矩阵"""
+        import numpy as np
+        from scipy import sparse
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(cols) for cols, weights in rows])
+        indices = np.concatenate([cols for cols, weights in rows]) if rows else np.zeros(0, dtype=np.int32)
+        data = np.concatenate([weights for cols, weights in rows]) if rows else np.zeros(0)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), len(self._vocabulary)))
+
+    def index_product(self, product):
+        """添加或更新单个商品，只改动该商品对应的行"""
+        counts = self._product_terms(product)
+        with self._lock:
+            self._remove_document(product.id)
+            self._add_document(product.id, counts)
+            if self._matrix is None:
+                return
+            self._delta[product.id] = self._row_weights(counts)
+            self._delta_matrix = None
+            if len(self._delta) > max(self.merge_min_rows, len(self._rows) * self.merge_ratio):
+                self._merge_delta()
+
+    def remove_product(self, product_id):
+        """移除单个商品"""
+        with self._lock:
+            self._remove_document(product_id)
+
+    def build_index(self, products):
+        """根据商品列表全量重建"""
+        documents = {product.id: self._product_terms(product) for product in products}
+        with self._lock:
+            self.documents = {}
+            self._doc_freq = Counter()
+            self._total_length = 0
+            for product_id, counts in documents.items():
+                self._add_document(product_id, counts)
+            self._build_matrix()
+
+    def _build_matrix(self):
+        """把全部商品的词频转换为 商品 × 词 的权重稀疏矩阵，并重新编号词表"""
+        import numpy as np
+        with timed('bm25_matrix'):
+            self._vocabulary = {}
+            product_ids = list(self.documents)
+            self._matrix = self._csr([self._row_weights(self.documents[product_id]) for product_id in product_ids])
+            self._row_ids = np.asarray(product_ids, dtype=np.int64)
+            self._rows = {product_id: row for row, product_id in enumerate(product_ids)}
+            self._delta = {}
+            self._delta_matrix = None
+            self._delta_ids = np.zeros(0, dtype=np.int64)
+
+    def _with_columns(self, matrix, n_columns):
+        """扩展列数（词表只增不减），共用原矩阵的数组"""
+        from scipy import sparse
+        return sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], n_columns))
+
+    def _merge_delta(self):
+        """去掉主矩阵中已清零的行，并把增量行追加进主矩阵"""
+        import numpy as np
+        from scipy import sparse
+        alive = np.fromiter(sorted(self._rows.values()), dtype=np.int64, count=len(self._rows))
+        delta_ids = list(self._delta)
+        main = self._with_columns(self._matrix, len(self._vocabulary))[alive]
+        self._matrix = sparse.vstack([main, self._csr([self._delta[product_id] for product_id in delta_ids])],
+                                     format='csr')
+        self._row_ids = np.concatenate([self._row_ids[alive], np.asarray(delta_ids, dtype=np.int64)])
+        self._rows = {int(product_id): row for row, product_id in enumerate(self._row_ids)}
+        self._delta = {}
+        self._delta_matrix = None
+        self._delta_ids = np.zeros(0, dtype=np.int64)
+
+    def search_scores(self, query, top_k=10):
+        """
+        执行BM25搜索
+
+        Returns:
+            dict: 按分数从高到低排列的 {product_id: score}；top_k 不为正时返回空结果
+        """
+        import numpy as np
+        if top_k <= 0:
+            # argpartition(..., -0)[-0:] 会取出全部匹配
+            return {}
+        query_terms = Counter(self.analyze(query))
+        for term in get_simple_search().expand_query(query):
+            for token in self.analyze(term):
+                if token not in query_terms:
+                    query_terms[token] = self.synonym_weight
+
+        with self._lock:
+            if not self.documents:
+                return {}
+            if self._matrix is None:
+                self._build_matrix()
+            if self._delta and self._delta_matrix is None:
+                self._delta_ids = np.asarray(list(self._delta), dtype=np.int64)
+                self._delta_matrix = self._csr(list(self._delta.values()))
+
+            terms = [term for term in query_terms if term in self._vocabulary and self._doc_freq[term] > 0]
+            if not terms:
+                return {}
+            # IDF 按当前的文档频率计算
+            n_docs = len(self.documents)
+            doc_freq = np.asarray([self._doc_freq[term] for term in terms], dtype=np.float64)
+            query_vector = np.zeros(len(self._vocabulary))
+            query_vector[[self._vocabulary[term] for term in terms]] = (
+                np.asarray([query_terms[term] for term in terms]) *
+                np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            )
+            matrices = [(self._matrix, self._row_ids)]
+            if self._delta:
+                matrices.append((self._delta_matrix, self._delta_ids))
+
+        scores = np.concatenate([matrix @ query_vector[:matrix.shape[1]] for matrix, ids in matrices])
+        product_ids = np.concatenate([ids for matrix, ids in matrices])
+        matched = np.flatnonzero(scores > 0)
+        if matched.size > top_k:
+            matched = matched[np.argpartition(scores[matched], -top_k)[-top_k:]]
+        ranked = matched[np.argsort(-scores[matched], kind='stable')]
+        return {int(product_ids[i]): float(scores[i]) for i in ranked}
+
+
+# 全局实例，第一次使用时才创建
+_bm25_search = None
+_bm25_search_lock = threading.Lock()
+
+def get_bm25_search():
+    """获取BM25搜索实例"""
+    global _bm25_search
+    if _bm25_search is None:
+        with _bm25_search_lock:
+            if _bm25_search is None:
+                with timed('bm25_search'):
+                    _bm25_search = BM25Search()
+    return _bm25_search
@@ -0,0 +1,197 @@
+"""
+商品变更跟踪模块
+记录自上次同步以来发生增删改的商品ID，供各检索索引做增量同步
+
+设置共享变更日志（SQLite 文件）后，每个进程记录的变更同时写入日志，
+其他工作进程同步索引前读取日志，各进程内存中的索引也能看到其他进程的修改；
+读到其他进程的修改时通知订阅者（如使本进程缓存的搜索结果失效）
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS product_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    origin INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class ProductChangeTracker:
+    """商品变更跟踪器
+
+    每个需要同步的索引（知识库、语义索引等）以名字注册为一个消费者，
+    各自维护一份待同步的商品ID集合，互不影响。
+    """
+
+    def __init__(self, shared_path=None, retention_seconds=86400.0):
+        self._lock = threading.Lock()
+        # 消费者名 -> {'initialized': 是否已完成首次全量同步, 'dirty': 待同步的商品ID}
+        self._consumers = {}
+        # 目录版本号，每次商品写入都会递增
+        self.version = 0
+        # 多个工作进程共用的变更日志文件路径，为空时只跟踪本进程的写入
+        self.shared_path = shared_path or None
+        # 变更日志保留这么久后清理；读取位置早于已清理部分的进程改为全量同步
+        self.retention_seconds = retention_seconds
+        # 已读到的变更日志位置，None 表示尚未读取（首次读取时从日志末尾开始）
+        self._last_seq = None
+        self._last_trim = 0.0
+        self._pull_lock = threading.Lock()
+        self._schema_ready = False
+        self._listeners = []
+
+    def subscribe(self, callback):
+        """读到其他进程的变更时回调 callback(商品ID集合)；变更日志已被清理、无法知道哪些商品变了时参数为 None"""
+        self._listeners.append(callback)
+
+    def _connect(self):
+        if not self._schema_ready:
+            # 第一次使用时才创建日志文件，只导入应用的脚本不会产生该文件
+            os.makedirs(os.path.dirname(self.shared_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.shared_path, timeout=30, isolation_level=None)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(SCHEMA)
+            finally:
+                conn.close()
+            self._schema_ready = True
+        return sqlite3.connect(self.shared_path, timeout=30, isolation_level=None)
+
+    def mark(self, product_id):
+        """记录某个商品发生了变化（新增、修改或删除）"""
+        self.mark_many([product_id])
+
+    def mark_many(self, product_ids):
+        """记录一批发生变化的商品，并写入共享变更日志"""
+        product_ids = set(product_ids)
+        if not product_ids:
+            return
+        self._mark_local(product_ids)
+        if self.shared_path:
+            self._publish(product_ids)
+
+    def _mark_local(self, product_ids):
+        with self._lock:
+            self.version += 1
+            for state in self._consumers.values():
+                state['dirty'].update(product_ids)
+
+    def _publish(self, product_ids):
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                conn.executemany(
+                    'INSERT INTO product_changes (product_id, origin, created_at) VALUES (?, ?, ?)',
+                    [(product_id, os.getpid(), now) for product_id in product_ids]
+                )
+                if now - self._last_trim > 3600:
+                    self._last_trim = now
+                    # 至少保留最新一条，其他进程据此判断自己的读取位置之后是否有记录被清理
+                    conn.execute(
+                        'DELETE FROM product_changes WHERE created_at < ? '
+                        'AND seq < (SELECT MAX(seq) FROM product_changes)',
+                        (now - self.retention_seconds,)
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"[ERROR] 写入共享变更日志失败（其他工作进程看不到这次修改）: {e}")
+
+    def poll(self):
+        """读取其他进程记录的变更（未设置共享变更日志时不做任何事）"""
+        if self.shared_path:
+            self._pull()
+
+    def _pull(self):
+        """读取其他进程在共享变更日志中记录的变更"""
+        with self._pull_lock:
+            try:
+                conn = self._connect()
+                try:
+                    if self._last_seq is None:
+                        # 本进程的索引首次同步都是全量的，只需从当前位置开始读取
+                        self._last_seq = conn.execute('SELECT MAX(seq) FROM product_changes').fetchone()[0] or 0
+                        return
+                    first_seq = conn.execute('SELECT MIN(seq) FROM product_changes').fetchone()[0]
+                    rows = conn.execute(
+                        'SELECT seq, product_id, origin FROM product_changes WHERE seq > ? ORDER BY seq',
+                        (self._last_seq,)
+                    ).fetchall()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"[ERROR] 读取共享变更日志失败: {e}")
+                return
+
+            if first_seq is not None and first_seq > self._last_seq + 1:
+                # 未读到的记录已被清理，无法知道哪些商品变了，全部消费者改为全量同步
+                print("[INFO] 共享变更日志已清理到本进程的读取位置之后，检索索引将全量同步")
+                with self._lock:
+                    self._consumers.clear()
+                    self.version += 1
+                changed = None
+            else:
+                changed = {product_id for seq, product_id, origin in rows if origin != os.getpid()}
+                if changed:
+                    self._mark_local(changed)
+            if rows:
+                self._last_seq = rows[-1][0]
+            if changed is None or changed:
+                for callback in self._listeners:
+                    callback(changed)
+
+    def pending(self, name):
+        """
+        取出某个消费者待同步的商品ID（包括其他进程记录的变更）
+
+        Returns:
+            set | None: 待同步的商品ID集合；None 表示该消费者尚未同步过，需要全量同步
+        """
+        self.poll()
+        with self._lock:
+            state = self._consumers.get(name)
+            if state is None or not state['initialized']:
+                self._consumers[name] = {'initialized': True, 'dirty': set()}
+                return None
+            dirty = state['dirty']
+            state['dirty'] = set()
+            return dirty
+
+    def is_synced(self, name):
+        """某个消费者是否已完成首次全量同步（未完成时下次同步本来就会全量重建）"""
+        with self._lock:
+            state = self._consumers.get(name)
+            return state is not None and state['initialized']
+
+    def requeue(self, name, product_ids=None):
+        """同步失败时放回待同步的商品ID；product_ids 为 None 时要求下次全量同步"""
+        with self._lock:
+            if product_ids is None:
+                self._consumers.pop(name, None)
+                return
+            state = self._consumers.get(name)
+            if state is not None:
+                state['dirty'].update(product_ids)
+
+    def discard(self, name, product_id):
+        """某个商品已由调用方直接同步，从该消费者的待同步集合中移除"""
+        with self._lock:
+            state = self._consumers.get(name)
+            if state is not None:
+                state['dirty'].discard(product_id)
+
+    def reset(self, name):
+        """要求某个消费者下次重新全量同步"""
+        self.requeue(name, None)
+
+
+# 全局变更跟踪器实例
+change_tracker = ProductChangeTracker(Config.CHANGE_LOG_PATH)
@@ -1,8 +1,17 @@
 import os
 from dotenv import load_dotenv
 
+from db_pool import build_engine_options
+
 load_dotenv()
 
+
+def _env_number(name, cast=int):
+    """读取可选的数值环境变量，未设置时返回 None"""
+    value = os.getenv(name)
+    return cast(value) if value not in (None, '') else None
+
+
 class Config:
     # 数据库配置 - 支持SQLite和MySQL
     USE_SQLITE = os.getenv('USE_SQLITE', 'true').lower() == 'true'
@@ -21,14 +30,78 @@ class Config:
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # 数据库连接池配置档：development / production / test（见 db_pool.POOL_PROFILES），
+    # 单项可用 DB_POOL_SIZE、DB_MAX_OVERFLOW、DB_POOL_TIMEOUT、DB_POOL_RECYCLE、DB_STATEMENT_TIMEOUT 覆盖
+    DB_POOL_PROFILE = os.getenv('DB_POOL_PROFILE', 'development')
+    SQLALCHEMY_ENGINE_OPTIONS = build_engine_options(SQLALCHEMY_DATABASE_URI, DB_POOL_PROFILE, {
+        'pool_size': _env_number('DB_POOL_SIZE'),
+        'max_overflow': _env_number('DB_MAX_OVERFLOW'),
+        'pool_timeout': _env_number('DB_POOL_TIMEOUT', float),
+        'pool_recycle': _env_number('DB_POOL_RECYCLE'),
+        'statement_timeout': _env_number('DB_STATEMENT_TIMEOUT', float),
+    })
+    
     # 安全密钥（固定值，避免每次重启变化）
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-please-change-in-production')
     
     # 文件上传配置
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16MB
+    # 商品图片派生图（缩略图、WebP/JPEG）的编码质量和后台处理线程数
+    IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 80))
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+    # 不再被引用的图片至少保留多少秒后才删除（刚上传、商品尚未保存的图片不会被误删）
+    IMAGE_GC_GRACE = int(os.getenv('IMAGE_GC_GRACE', 300))
+    # 商品ID -> 图片路径缓存的容量（条）和有效期（秒，其他工作进程修改图片后最多延迟这么久生效）
+    IMAGE_CACHE_SIZE = int(os.getenv('IMAGE_CACHE_SIZE', 2000))
+    IMAGE_CACHE_TTL = int(os.getenv('IMAGE_CACHE_TTL', 60))
+    # 非内容寻址图片（旧上传文件等）的浏览器缓存时间（秒），过期后凭 ETag 重新验证
+    IMAGE_MAX_AGE = int(os.getenv('IMAGE_MAX_AGE', 3600))
     
     # 语义检索配置
     SEMANTIC_MODEL = os.getenv('SEMANTIC_MODEL', 'paraphrase-multilingual-MiniLM-L12-v2')
     FAISS_INDEX_PATH = os.getenv('FAISS_INDEX_PATH', 'data/faiss_index.bin')
-    VECTOR_DIM = int(os.getenv('VECTOR_DIM', 384))
\ No newline at end of file
+    VECTOR_DIM = int(os.getenv('VECTOR_DIM', 384))
+    # 向量编码器：sentence-transformers（默认，使用 SEMANTIC_MODEL）或 hashing（确定性哈希编码，测试用，无需下载模型）
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'sentence-transformers')
+    # 每批编码的商品数
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+    # 以内存映射方式打开向量索引，多个工作进程共享一份；Windows 下被映射的文件无法替换，需设为 false
+    FAISS_MMAP = os.getenv('FAISS_MMAP', 'true').lower() == 'true'
+    # 单本书籍变化后最多等待多少秒再发布向量索引，期间的变化合并为一次发布
+    VECTOR_PUBLISH_DELAY = float(os.getenv('VECTOR_PUBLISH_DELAY', 5))
+    
+    # 后台任务队列（索引维护等），任务保存在本地 SQLite 文件中
+    JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', 'data/jobs.db')
+    # 任务最多执行次数，失败后按 JOB_RETRY_DELAY 秒起指数退避重试
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+    JOB_RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY', 5))
+    
+    # 多个工作进程共用的商品变更日志（SQLite 文件），各进程据此增量同步自己内存中的检索索引；留空则只跟踪本进程的写入
+    CHANGE_LOG_PATH = os.getenv('CHANGE_LOG_PATH', 'data/changes.db')
+    
+    # 搜索结果缓存：容量（条）和有效期（秒）
+    SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 1000))
+    SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', 300))
+    # 多个工作进程共享的缓存文件（如 data/search_cache.db），留空则只使用进程内缓存
+    SEARCH_CACHE_PATH = os.getenv('SEARCH_CACHE_PATH', '')
+    
+    # 分词缓存容量（条），超出后按LRU淘汰
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 5000))
+    
+    # 商品列表分页配置
+    PRODUCTS_PAGE_SIZE = int(os.getenv('PRODUCTS_PAGE_SIZE', 50))
+    PRODUCTS_MAX_PAGE_SIZE = int(os.getenv('PRODUCTS_MAX_PAGE_SIZE', 200))
+    PRODUCTS_STREAM_BATCH_SIZE = int(os.getenv('PRODUCTS_STREAM_BATCH_SIZE', 500))
+    
+    # 评价列表分页配置
+    REVIEWS_PAGE_SIZE = int(os.getenv('REVIEWS_PAGE_SIZE', 20))
+    REVIEWS_MAX_PAGE_SIZE = int(os.getenv('REVIEWS_MAX_PAGE_SIZE', 100))
+    
+    # 知识库持久化目录（快照 + 变更日志），留空则只保存在内存中
+    KB_STORE_DIR = os.getenv('KB_STORE_DIR', 'data/knowledge_base')
+    # 变更日志累计多少条后重新生成快照
+    KB_SNAPSHOT_EVERY = int(os.getenv('KB_SNAPSHOT_EVERY', 1000))
+    
+    # 导入应用时是否在后台线程中预热检索引擎（直接运行 app.py 时总会预热）
+    SEARCH_PREWARM = os.getenv('SEARCH_PREWARM', 'false').lower() == 'true'
@@ -0,0 +1,125 @@
+"""
+数据库连接池配置与监控
+- 按运行环境选择连接池配置档（连接数、溢出、超时、回收时间、语句超时），由 config.py 生成 SQLALCHEMY_ENGINE_OPTIONS
+- MeteredQueuePool 在 QueuePool 的基础上统计借出连接数和等待连接的时间，供 /api/db_pool/stats 查看
+"""
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+# 连接池配置档：
+#   pool_size / max_overflow: 常驻连接数 / 高峰时额外允许的连接数
+#   pool_timeout: 连接全部借出时最多等待的秒数，超时报错而不是无限排队
+#   pool_recycle: 连接使用超过这么多秒后重建，需小于 MySQL wait_timeout 及中间代理的空闲超时
+#   statement_timeout: 单条查询的最长执行秒数（MySQL）
+POOL_PROFILES = {
+    'development': {'pool_size': 5, 'max_overflow': 5, 'pool_timeout': 10,
+                    'pool_recycle': 1800, 'statement_timeout': 30},
+    'production': {'pool_size': 20, 'max_overflow': 20, 'pool_timeout': 5,
+                   'pool_recycle': 280, 'statement_timeout': 10},
+    'test': {'pool_size': 2, 'max_overflow': 0, 'pool_timeout': 5,
+             'pool_recycle': 1800, 'statement_timeout': 10},
+}
+
+
+class MeteredQueuePool(QueuePool):
+    """记录借出连接数和等待时间的 QueuePool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.connections_created = 0
+        self.timeouts = 0
+        # 从请求连接到拿到连接的耗时（秒），包括新建连接
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        # 等待超过 1 毫秒（即连接池已耗尽或需要新建连接）的次数
+        self.slow_checkouts = 0
+        self.peak_checked_out = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            # 连接全部借出且等待超过 pool_timeout
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._metrics_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if waited > 0.001:
+                self.slow_checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+        return record
+
+    def _create_connection(self):
+        with self._metrics_lock:
+            self.connections_created += 1
+        return super()._create_connection()
+
+    def get_stats(self):
+        """获取连接池统计信息（自连接池创建以来）"""
+        with self._metrics_lock:
+            return {
+                'pool_size': self.size(),
+                'max_overflow': self._max_overflow,
+                'timeout': self._timeout,
+                'checked_out': self.checkedout(),
+                'checked_in': self.checkedin(),
+                'overflow': self.overflow(),
+                'peak_checked_out': self.peak_checked_out,
+                'checkouts': self.checkouts,
+                'connections_created': self.connections_created,
+                'timeouts': self.timeouts,
+                'slow_checkouts': self.slow_checkouts,
+                'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3)
+            }
+
+
+def build_engine_options(database_uri, profile='development', overrides=None):
+    """
+    生成 SQLALCHEMY_ENGINE_OPTIONS
+
+    Args:
+        database_uri: 数据库连接串
+        profile: POOL_PROFILES 中的配置档名
+        overrides: 覆盖配置档中的单项（值为 None 的忽略）
+
+    Returns:
+        dict: create_engine 的参数
+    """
+    if profile not in POOL_PROFILES:
+        raise ValueError(f"未知的连接池配置档: {profile}（可选 {', '.join(POOL_PROFILES)}）")
+    settings = dict(POOL_PROFILES[profile])
+    settings.update({key: value for key, value in (overrides or {}).items() if value is not None})
+
+    options = {
+        'poolclass': MeteredQueuePool,
+        'pool_size': settings['pool_size'],
+        'max_overflow': settings['max_overflow'],
+        'pool_timeout': settings['pool_timeout'],
+    }
+    if database_uri.startswith('mysql'):
+        statement_timeout = settings['statement_timeout']
+        options.update({
+            # 借出前检测连接是否已被服务端断开，避免 "MySQL server has gone away"
+            'pool_pre_ping': True,
+            'pool_recycle': settings['pool_recycle'],
+            'connect_args': {
+                'connect_timeout': 10,
+                # 客户端读写超时略大于服务端语句超时，服务端先中止查询
+                'read_timeout': statement_timeout + 5,
+                'write_timeout': statement_timeout + 5,
+                # MAX_EXECUTION_TIME（毫秒）限制 SELECT 的执行时间，MySQL 5.7.8+
+                'init_command': f'SET SESSION MAX_EXECUTION_TIME={int(statement_timeout * 1000)}',
+            },
+        })
+    return options
@@ -0,0 +1,114 @@
+"""
+图片查找缓存模块
+/image/<product_id> 与 /uploads/<path> 的热点图片无需每次查询数据库或读取文件：
+- 商品ID -> 图片路径的 LRU 缓存，商品写入时失效；其他工作进程的修改最多延迟 ttl 秒可见
+- 图片文件 -> SHA-256 内容哈希（作为强 ETag）的 LRU 缓存，文件修改时间或大小变化后重新计算
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+
+class ImageLookupCache:
+    """商品图片路径与图片内容哈希的 LRU 缓存"""
+
+    def __init__(self, max_size=2000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        # 商品ID -> (过期时间, 图片路径或 None)
+        self._paths = OrderedDict()
+        # 文件路径 -> ((修改时间, 大小), 内容哈希)
+        self._digests = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _put(self, entries, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+
+    def product_image(self, product_id, load):
+        """
+        商品的图片路径，未命中时调用 load(product_id) 查询
+
+        Returns:
+            str | None: 相对 static 的图片路径；商品不存在或没有图片时为 None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._paths.get(product_id)
+            if entry is not None and entry[0] > now:
+                self._paths.move_to_end(product_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        path = load(product_id)
+        with self._lock:
+            self._put(self._paths, product_id, (now + self.ttl, path))
+        return path
+
+    def invalidate(self, product_id):
+        """商品写入后调用"""
+        with self._lock:
+            self._paths.pop(product_id, None)
+
+    def file_digest(self, file_path):
+        """
+        文件内容的 SHA-256
+
+        Returns:
+            str | None: 文件不存在时为 None
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        identity = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._digests.get(file_path)
+            if entry is not None and entry[0] == identity:
+                self._digests.move_to_end(file_path)
+                return entry[1]
+
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        with self._lock:
+            self._put(self._digests, file_path, (identity, digest))
+        return digest
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'products': len(self._paths),
+                'digests': len(self._digests),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+# 全局实例，第一次使用时才创建
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+def get_image_cache():
+    """获取图片查找缓存实例"""
+    global _image_cache
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                _image_cache = ImageLookupCache(Config.IMAGE_CACHE_SIZE, Config.IMAGE_CACHE_TTL)
+    return _image_cache
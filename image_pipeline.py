@@ -0,0 +1,212 @@
+"""
+上传图片处理模块
+为商品图片生成固定尺寸的缩略图和展示图，页面按需要的尺寸引用，不再直接加载原图：
+- 每个尺寸同时生成 WebP 和 JPEG（不支持 WebP 的浏览器回退到 JPEG）
+- 生成时按 EXIF 方向旋转后丢弃全部元数据（EXIF、GPS、ICC 等）
+- 在线程池中后台处理，上传请求无需等待；尚未生成时页面暂时引用原图
+派生图保存在 static/derived/ 下，与原图的相对路径一一对应
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+# 尺寸名 -> 最长边像素
+IMAGE_SIZES = {
+    'thumb': 240,
+    'medium': 640,
+    'large': 1280,
+}
+# 格式名 -> (文件扩展名, Pillow 保存参数)
+IMAGE_FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'optimize': True, 'progressive': True}),
+}
+
+
+def normalize_image_path(path):
+    """数据库中的图片路径转为相对 static 目录的路径（兼容反斜杠和 static/ 前缀）"""
+    path = (path or '').replace('\\', '/').lstrip('/')
+    if path.startswith('static/'):
+        path = path[len('static/'):]
+    return path
+
+
+class ImagePipeline:
+    """商品图片派生图生成与查找"""
+
+    def __init__(self, static_folder='static', derived_dir='derived', sizes=None,
+                 quality=80, workers=2):
+        self.static_folder = static_folder
+        self.derived_dir = derived_dir
+        self.sizes = sizes or IMAGE_SIZES
+        self.quality = quality
+        self.workers = workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # 已确认存在的派生图（相对 static 的路径），避免每次渲染都访问磁盘
+        self._existing = set()
+        # 正在处理的原图，避免同一张图重复提交
+        self._in_progress = set()
+        self._lock = threading.Lock()
+
+    def derivative_path(self, path, size, fmt):
+        """派生图相对 static 目录的路径"""
+        stem = os.path.splitext(normalize_image_path(path))[0]
+        return f"{self.derived_dir}/{stem}_{size}.{IMAGE_FORMATS[fmt][0]}"
+
+    def _abs(self, rel_path):
+        return os.path.join(self.static_folder, *rel_path.split('/'))
+
+    def has_derivative(self, path, size, fmt):
+        rel_path = self.derivative_path(path, size, fmt)
+        if rel_path in self._existing:
+            return True
+        if os.path.exists(self._abs(rel_path)):
+            with self._lock:
+                self._existing.add(rel_path)
+            return True
+        return False
+
+    def image_url_path(self, path, size='thumb', fmt='jpeg'):
+        """
+        页面引用的图片路径（相对 static）
+
+        Returns:
+            str | None: 派生图已生成时返回派生图，否则返回原图；没有图片时返回 None
+        """
+        path = normalize_image_path(path)
+        if not path:
+            return None
+        if size in self.sizes and self.has_derivative(path, size, fmt):
+            return self.derivative_path(path, size, fmt)
+        return path
+
+    def remove_derivatives(self, path):
+        """原图被删除后删除其全部派生图"""
+        for size in self.sizes:
+            for fmt in IMAGE_FORMATS:
+                rel_path = self.derivative_path(path, size, fmt)
+                with self._lock:
+                    self._existing.discard(rel_path)
+                try:
+                    os.remove(self._abs(rel_path))
+                except FileNotFoundError:
+                    pass
+
+    def process(self, path, force=False):
+        """
+        同步生成一张原图的全部派生图
+
+        Returns:
+            int: 新生成的文件数
+        """
+        from PIL import Image, ImageOps
+
+        path = normalize_image_path(path)
+        targets = [(size, fmt) for size in self.sizes for fmt in IMAGE_FORMATS
+                   if force or not self.has_derivative(path, size, fmt)]
+        if not targets:
+            return 0
+
+        with Image.open(self._abs(path)) as source:
+            # 动图只取第一帧；先按 EXIF 方向旋转，之后的图像不再携带任何元数据
+            source.seek(0)
+            image = ImageOps.exif_transpose(source)
+            has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+            image.load()
+
+        created = 0
+        for size in {size for size, fmt in targets}:
+            resized = image.copy()
+            # 只缩小不放大
+            resized.thumbnail((self.sizes[size], self.sizes[size]), Image.LANCZOS)
+            for fmt in IMAGE_FORMATS:
+                if (size, fmt) not in targets:
+                    continue
+                output = resized
+                if fmt == 'jpeg' and output.mode == 'RGBA':
+                    # JPEG 不支持透明，铺白底
+                    background = Image.new('RGB', output.size, (255, 255, 255))
+                    background.paste(output, mask=output.getchannel('A'))
+                    output = background
+                self._save(output, self.derivative_path(path, size, fmt), fmt)
+                created += 1
+        return created
+
+    def _save(self, image, rel_path, fmt):
+        """先写临时文件再原子替换，页面不会引用到写了一半的文件"""
+        target = self._abs(rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+        params = dict(IMAGE_FORMATS[fmt][1])
+        # 不传 exif / icc_profile，保存的文件不含任何元数据
+        image.save(tmp_path, quality=self.quality, **params)
+        os.replace(tmp_path, target)
+        with self._lock:
+            self._existing.add(rel_path)
+
+    def process_all(self, paths, force=False):
+        """
+        在线程池中并行处理多张原图，等待全部完成（批量补生成用）
+
+        Returns:
+            tuple: (新生成的文件数, 失败的原图列表)
+        """
+        paths = list(paths)
+        executor = self._get_executor()
+        futures = [executor.submit(self.process, path, force) for path in paths]
+        created, failed = 0, []
+        for path, future in zip(paths, futures):
+            try:
+                created += future.result()
+            except Exception as e:
+                print(f"[ERROR] 处理图片 {path} 失败: {e}")
+                failed.append(path)
+        return created, failed
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='image-worker')
+        return self._executor
+
+    def _run(self, path):
+        try:
+            created = self.process(path)
+            if created:
+                print(f"[OK] 已生成图片 {path} 的 {created} 个派生图")
+        except Exception as e:
+            print(f"[ERROR] 处理图片 {path} 失败: {e}")
+        finally:
+            with self._lock:
+                self._in_progress.discard(path)
+
+    def submit(self, path):
+        """提交到线程池后台处理（Pillow 缩放和编码时释放 GIL，多个线程可并行）"""
+        path = normalize_image_path(path)
+        if not path:
+            return None
+        with self._lock:
+            if path in self._in_progress:
+                return None
+            self._in_progress.add(path)
+        return self._get_executor().submit(self._run, path)
+
+
+# 全局实例，第一次使用时才创建
+_image_pipeline = None
+_image_pipeline_lock = threading.Lock()
+
+def get_image_pipeline():
+    """获取图片处理实例"""
+    global _image_pipeline
+    if _image_pipeline is None:
+        with _image_pipeline_lock:
+            if _image_pipeline is None:
+                _image_pipeline = ImagePipeline(quality=Config.IMAGE_QUALITY, workers=Config.IMAGE_WORKERS)
+    return _image_pipeline
@@ -0,0 +1,287 @@
+"""
+按内容寻址的图片存储
+图片以 SHA-256 命名保存在 static/blobs/<前两位>/<哈希>.<扩展名>，同一张图片无论上传多少次只存一份：
+- Product.image / Order.product_image 保存 blob 的相对路径，引用计数保存在 image_blobs 表中（见 app.py）
+- 引用计数降为 0 的 blob 由后台任务回收，同时删除其派生图
+- 文件内容与路径一一对应、永不修改，可以使用长期不变的缓存头
+- 上传时分块写入临时文件并同时计算哈希，开头几个字节不是支持的图片格式就立即拒绝，
+  校验通过后原子重命名为 blob
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from config import Config
+from image_pipeline import get_image_pipeline, normalize_image_path
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只保证进程内的互斥
+    fcntl = None
+
+# 图片格式（Pillow 识别结果）-> 扩展名；扩展名由内容决定，保证同一内容只有一个路径
+FORMAT_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+# 文件头（magic bytes）-> 图片格式；WebP 需要前 12 字节才能确定
+_MAGIC_BYTES = [
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+]
+SNIFF_BYTES = 12
+_BLOB_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z]+$')
+# blob 及其派生图（文件名为 <哈希>_<尺寸>.<扩展名>）
+_CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{64}(_[a-z]+)?\.[a-z]+$')
+
+
+def sniff_image_format(head):
+    """按文件头识别图片格式，不是支持的格式返回 None"""
+    for magic, image_format in _MAGIC_BYTES:
+        if head.startswith(magic):
+            return image_format
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+class UnsupportedImageError(Exception):
+    """上传的文件不是支持的图片格式
+
+    不继承 ValueError：Werkzeug 解析表单时会静默吞掉 ValueError，返回空表单
+    """
+
+
+class ImageUpload:
+    """上传图片的临时文件：边写入边计算 SHA-256，写满文件头后立即校验格式
+
+    可作为 Werkzeug 解析 multipart 表单时的文件流（见 app.py 的 WeBookRequest），
+    不支持的文件在读到开头几个字节时就中止解析，无需等整个请求体上传完
+    """
+
+    def __init__(self, tmp_path):
+        self.path = tmp_path
+        self._file = open(tmp_path, 'w+b')
+        self._digest = hashlib.sha256()
+        self._head = b''
+        self.format = None
+        self.size = 0
+
+    def write(self, data):
+        if self.format is None:
+            self._head += bytes(data[:SNIFF_BYTES - len(self._head)])
+            if len(self._head) >= SNIFF_BYTES:
+                self._sniff()
+        self._digest.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def _sniff(self):
+        self.format = sniff_image_format(self._head)
+        if self.format is None:
+            # 解析中止时 Werkzeug 不会再关闭这个文件，这里直接删除
+            self.close()
+            raise UnsupportedImageError('不支持的图片格式')
+
+    def finish(self):
+        """
+        写入结束后调用，校验整个文件
+
+        Returns:
+            tuple: (内容哈希, 扩展名)
+        """
+        from PIL import Image
+
+        if self.format is None:
+            # 文件短于 SNIFF_BYTES
+            self._sniff()
+        self._file.flush()
+        self._file.seek(0)
+        try:
+            with Image.open(self._file) as image:
+                image_format = image.format
+        except Exception:
+            image_format = None
+        if image_format != self.format:
+            raise UnsupportedImageError('图片文件已损坏或格式与文件头不符')
+        # 关闭后才能在 Windows 上重命名
+        self._file.close()
+        return self._digest.hexdigest(), FORMAT_EXTENSIONS[self.format]
+
+    def __getattr__(self, name):
+        # read / seek / tell 等直接交给临时文件
+        return getattr(self._file, name)
+
+    def close(self):
+        """关闭并删除临时文件（已存入 blob 的临时文件已被重命名，不受影响）"""
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ImageStore:
+    """按 SHA-256 内容寻址的图片文件存储"""
+
+    def __init__(self, static_folder='static', blob_dir='blobs', gc_grace_seconds=300, chunk_size=64 * 1024):
+        self.static_folder = static_folder
+        self.blob_dir = blob_dir
+        # 刚写入（或刚被再次上传）的 blob 在这段时间内不回收：对应的商品可能还没提交
+        self.gc_grace_seconds = gc_grace_seconds
+        self.chunk_size = chunk_size
+        self.lock_path = os.path.join(static_folder, blob_dir, '.lock')
+        self._lock = threading.Lock()
+
+    def _abs(self, rel_path):
+        return os.path.join(self.static_folder, *rel_path.split('/'))
+
+    def blob_path(self, digest, ext):
+        """blob 相对 static 目录的路径"""
+        return f"{self.blob_dir}/{digest[:2]}/{digest}.{ext}"
+
+    def is_blob(self, path):
+        """是否为本存储管理的路径（旧的 uploads/、images/ 路径不参与引用计数）"""
+        path = normalize_image_path(path)
+        prefix = self.blob_dir + '/'
+        return path.startswith(prefix) and bool(_BLOB_NAME.match(path.rsplit('/', 1)[-1]))
+
+    def blob_digest(self, path):
+        """blob 路径中的内容哈希；不是 blob 时返回 None"""
+        path = normalize_image_path(path)
+        return path.rsplit('/', 1)[-1].split('.', 1)[0] if self.is_blob(path) else None
+
+    def is_content_addressed(self, path):
+        """路径对应的内容是否永不改变（blob 本身，以及由 blob 生成的派生图）"""
+        path = normalize_image_path(path)
+        derived_prefix = f"{get_image_pipeline().derived_dir}/"
+        if path.startswith(derived_prefix):
+            path = path[len(derived_prefix):]
+        prefix = self.blob_dir + '/'
+        return path.startswith(prefix) and bool(_CONTENT_ADDRESSED.match(path[len(prefix):]))
+
+    @contextmanager
+    def _file_lock(self):
+        """写入与回收互斥（跨进程），避免回收掉正在被重新上传的同一内容"""
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with self._lock, open(self.lock_path, 'a') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def open_upload(self):
+        """创建上传用的临时文件，与 blob 在同一目录树下，存入时可原子重命名"""
+        tmp_dir = os.path.join(self.static_folder, self.blob_dir, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        return ImageUpload(os.path.join(tmp_dir, f'{os.getpid()}.{threading.get_ident()}.{time.time_ns()}'))
+
+    def commit_upload(self, upload):
+        """
+        把写完的上传文件存为 blob；已有相同内容时丢弃临时文件
+
+        Returns:
+            str: blob 相对 static 目录的路径
+
+        Raises:
+            UnsupportedImageError: 不是支持的图片格式
+        """
+        digest, ext = upload.finish()
+        return self._commit(upload.path, digest, ext)
+
+    def save(self, stream):
+        """
+        保存图片流（未经 WeBookRequest 流式解析的文件）
+
+        Returns:
+            str: blob 相对 static 目录的路径
+
+        Raises:
+            UnsupportedImageError: 不是支持的图片格式
+        """
+        if isinstance(stream, ImageUpload):
+            return self.commit_upload(stream)
+        upload = self.open_upload()
+        try:
+            for chunk in iter(lambda: stream.read(self.chunk_size), b''):
+                upload.write(chunk)
+            return self.commit_upload(upload)
+        finally:
+            upload.close()
+
+    def save_file(self, path):
+        """把已有的图片文件（如旧的 uploads/ 下的文件）复制进存储"""
+        with open(path, 'rb') as f:
+            return self.save(f)
+
+    def _commit(self, tmp_path, digest, ext):
+        rel_path = self.blob_path(digest, ext)
+        target = self._abs(rel_path)
+        with self._file_lock():
+            if os.path.exists(target):
+                # 已有相同内容：刷新修改时间，使其在宽限期内不被回收
+                os.utime(target)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+        return rel_path
+
+    def delete(self, path):
+        """
+        删除不再被引用的 blob 及其派生图
+
+        Returns:
+            bool: 已删除；在宽限期内（可能正被重新上传）时返回 False，调用方稍后重试
+        """
+        path = normalize_image_path(path)
+        if not self.is_blob(path):
+            return True
+        target = self._abs(path)
+        with self._file_lock():
+            try:
+                age = time.time() - os.path.getmtime(target)
+            except OSError:
+                age = None
+            if age is not None:
+                if age < self.gc_grace_seconds:
+                    return False
+                os.remove(target)
+        get_image_pipeline().remove_derivatives(path)
+        return True
+
+    def iter_blobs(self):
+        """遍历存储中的全部 blob 路径"""
+        root = os.path.join(self.static_folder, self.blob_dir)
+        if not os.path.isdir(root):
+            return
+        for prefix in sorted(os.listdir(root)):
+            directory = os.path.join(root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if _BLOB_NAME.match(name):
+                    yield f"{self.blob_dir}/{prefix}/{name}"
+
+
+# 全局实例，第一次使用时才创建
+_image_store = None
+_image_store_lock = threading.Lock()
+
+def get_image_store():
+    """获取图片存储实例"""
+    global _image_store
+    if _image_store is None:
+        with _image_store_lock:
+            if _image_store is None:
+                _image_store = ImageStore(gc_grace_seconds=Config.IMAGE_GC_GRACE)
+    return _image_store
@@ -7,7 +7,8 @@ import os
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, db, Product, semantic_search_service
+from app import app, db, Product
+from semantic_search import get_vector_search
 
 
 def init_database():
@@ -31,7 +32,7 @@ def rebuild_semantic_index():
         
         if products:
             print("正在重建语义检索索引...")
-            semantic_search_service.rebuild_index(products)
+            get_vector_search().rebuild_index(products)
             print("索引重建完成!")
         else:
             print("没有商品数据,跳过索引创建")
@@ -0,0 +1,276 @@
+"""
+后台任务队列
+任务保存在本地 SQLite 文件的 jobs 表中，由后台线程逐个执行，无需外部消息服务：
+- 同一对象尚未执行的重复任务合并为一个（例如同一本书连续修改多次只更新一次索引）
+- 执行失败按指数退避重试，超过次数后标记为 failed
+- 多个进程可共用同一个任务文件，领取任务时加写锁，同一任务只会被一个进程执行
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+from config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    coalesced INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    run_after REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_run_after ON jobs (status, run_after);
+CREATE INDEX IF NOT EXISTS ix_jobs_kind_key_status ON jobs (kind, key, status);
+"""
+
+
+class JobQueue:
+    """基于 SQLite 的任务队列"""
+
+    def __init__(self, path, max_attempts=3, retry_delay=5.0, lease_seconds=300.0,
+                 poll_interval=1.0, retention_seconds=86400.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        # 第 n 次失败后等待 retry_delay * 2^(n-1) 秒再重试
+        self.retry_delay = retry_delay
+        # 执行中的任务超过这么久未续期，视为所在进程已退出，可被重新领取（执行期间每 1/3 租约续期一次）
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        # 已完成的任务保留这么久后清理
+        self.retention_seconds = retention_seconds
+        # 任务类型 -> 处理函数 handler(key, payload)
+        self.handlers = {}
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        # isolation_level=None：由代码显式 BEGIN IMMEDIATE，保证领取任务时的读改写是原子的
+        if not self._schema_ready:
+            # 第一次使用时才创建任务文件，只导入应用的脚本不会产生该文件
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with _Connection(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(SCHEMA)
+            self._schema_ready = True
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return _Connection(conn)
+
+    def register(self, kind, handler):
+        """注册某类任务的处理函数"""
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, key, payload=None, delay=0):
+        """
+        提交任务；同一 (kind, key) 已有未开始的任务时合并为一个
+
+        Returns:
+            int: 任务ID
+        """
+        now = time.time()
+        payload_json = json.dumps(payload, ensure_ascii=False) if payload is not None else None
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND key = ? AND status = 'pending' LIMIT 1",
+                (kind, str(key))
+            ).fetchone()
+            if row:
+                job_id = row['id']
+                conn.execute(
+                    'UPDATE jobs SET payload = ?, coalesced = coalesced + 1, updated_at = ? WHERE id = ?',
+                    (payload_json, now, job_id)
+                )
+            else:
+                job_id = conn.execute(
+                    'INSERT INTO jobs (kind, key, payload, run_after, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (kind, str(key), payload_json, now + delay, now, now)
+                ).lastrowid
+            conn.execute('COMMIT')
+        self.start_worker()
+        self._wakeup.set()
+        return job_id
+
+    def claim(self):
+        """领取一个到期的任务，没有则返回 None"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE (status = 'pending' AND run_after <= ?) "
+                "OR (status = 'running' AND started_at < ?) ORDER BY id LIMIT 1",
+                (now, now - self.lease_seconds)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, updated_at = ? WHERE id = ?",
+                    (now, now, row['id'])
+                )
+            conn.execute('COMMIT')
+        if row is None:
+            return None
+        job = dict(row)
+        job['attempts'] += 1
+        return job
+
+    def _finish(self, job, error=None):
+        now = time.time()
+        with self._connect() as conn:
+            if error is None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'done', last_error = NULL, finished_at = ?, updated_at = ? WHERE id = ?",
+                    (now, now, job['id'])
+                )
+            elif job['attempts'] >= self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', last_error = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+                    (error, now, now, job['id'])
+                )
+            else:
+                run_after = now + self.retry_delay * 2 ** (job['attempts'] - 1)
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', last_error = ?, run_after = ?, updated_at = ? WHERE id = ?",
+                    (error, run_after, now, job['id'])
+                )
+
+    def _renew_lease(self, job, stop):
+        """任务执行期间定期刷新 started_at，耗时超过租约的任务（如全量重建）不会被其他进程重复领取"""
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                with self._connect() as conn:
+                    now = time.time()
+                    conn.execute(
+                        "UPDATE jobs SET started_at = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+                        (now, now, job['id'])
+                    )
+            except sqlite3.Error as e:
+                print(f"[ERROR] 续期任务 {job['id']} 的租约失败: {e}")
+
+    def run_job(self, job):
+        """执行一个已领取的任务"""
+        handler = self.handlers.get(job['kind'])
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._renew_lease, args=(job, stop), name='job-lease', daemon=True)
+        heartbeat.start()
+        try:
+            if handler is None:
+                raise LookupError(f"未注册的任务类型: {job['kind']}")
+            payload = json.loads(job['payload']) if job['payload'] else None
+            handler(job['key'], payload)
+        except Exception as e:
+            print(f"[ERROR] 任务 {job['id']}（{job['kind']} {job['key']}）第 {job['attempts']} 次执行失败: {e}")
+            self._finish(job, ''.join(traceback.format_exception_only(type(e), e)).strip())
+            return False
+        finally:
+            stop.set()
+            heartbeat.join()
+        self._finish(job)
+        return True
+
+    def run_pending(self):
+        """在当前线程执行所有到期任务，返回执行的任务数（命令行脚本和调试用）"""
+        count = 0
+        while True:
+            job = self.claim()
+            if job is None:
+                return count
+            self.run_job(job)
+            count += 1
+
+    def cleanup(self):
+        """清理过期的已完成任务"""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status = 'done' AND finished_at < ?",
+                (time.time() - self.retention_seconds,)
+            )
+
+    def _work(self):
+        last_cleanup = 0
+        while True:
+            try:
+                job = self.claim()
+                if job is not None:
+                    self.run_job(job)
+                    continue
+                if time.time() - last_cleanup > 3600:
+                    self.cleanup()
+                    last_cleanup = time.time()
+            except Exception as e:
+                print(f"[ERROR] 任务队列出错: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start_worker(self):
+        """启动后台工作线程（每个进程一个，重复调用无影响）"""
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name='job-worker', daemon=True)
+                self._worker.start()
+
+    def get_job(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_stats(self, recent=20):
+        """各状态任务数及最近失败的任务"""
+        with self._connect() as conn:
+            counts = {row['status']: row['n'] for row in
+                      conn.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')}
+            failed = [dict(row) for row in conn.execute(
+                "SELECT * FROM jobs WHERE status = 'failed' ORDER BY finished_at DESC LIMIT ?", (recent,)
+            )]
+            oldest_pending = conn.execute(
+                "SELECT MIN(created_at) AS t FROM jobs WHERE status = 'pending'"
+            ).fetchone()['t']
+        return {
+            'counts': {status: counts.get(status, 0) for status in ('pending', 'running', 'done', 'failed')},
+            'oldest_pending_age': round(time.time() - oldest_pending, 3) if oldest_pending else None,
+            'worker_alive': bool(self._worker and self._worker.is_alive()),
+            'recent_failed': failed
+        }
+
+
+class _Connection:
+    """用完即关闭的 sqlite3 连接（sqlite3 自带的上下文管理器只提交事务，不关闭连接）"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._conn.in_transaction:
+            self._conn.execute('ROLLBACK')
+        self._conn.close()
+
+
+# 全局实例，第一次使用时才创建
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """获取任务队列实例"""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue(Config.JOB_QUEUE_PATH,
+                                      max_attempts=Config.JOB_MAX_ATTEMPTS,
+                                      retry_delay=Config.JOB_RETRY_DELAY)
+    return _job_queue
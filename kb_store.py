@@ -0,0 +1,134 @@
+"""
+知识库持久化模块
+把书籍三元组保存为二进制快照，并用追加写的变更日志记录之后的增删改：
+- 进程启动时加载快照并重放日志，无需重新分析全部书籍
+- 多个工作进程共用同一目录，搜索前读取日志新增的部分，即可看到其他进程的修改
+"""
+import json
+import os
+import pickle
+import threading
+
+
+class KnowledgeBaseStore:
+    """知识库快照 + 变更日志"""
+
+    def __init__(self, directory, compact_after=1000):
+        self.directory = directory
+        # 日志累计超过这么多条后重新生成快照
+        self.compact_after = compact_after
+        self.generation = 0
+        self._offset = 0
+        self._entries_since_snapshot = 0
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.directory, 'snapshot.pickle')
+
+    @property
+    def current_path(self):
+        # 记录最新快照的代数，其他进程据此判断是否需要重新加载快照
+        return os.path.join(self.directory, 'CURRENT')
+
+    def log_path(self, generation):
+        return os.path.join(self.directory, f'delta.{generation}.log')
+
+    def _read_current_generation(self):
+        try:
+            with open(self.current_path, encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def open(self, kb):
+        """启动时加载快照并重放变更日志"""
+        with self._lock:
+            self.generation = self._read_current_generation()
+            self._offset = 0
+            self._entries_since_snapshot = 0
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, 'rb') as f:
+                    snapshot = pickle.load(f)
+                self.generation = snapshot['generation']
+                kb.load_book_triples(snapshot['triples'], snapshot['fingerprints'])
+            applied = self._replay(kb)
+            print(f"[OK] 已从快照加载 {len(kb.fingerprints)} 本书籍，重放 {applied} 条变更日志")
+
+    def catch_up(self, kb):
+        """读取其他进程追加的变更；若已有更新的快照则重新加载"""
+        with self._lock:
+            if self._read_current_generation() != self.generation:
+                self.open(kb)
+                return
+            self._replay(kb)
+
+    def _replay(self, kb):
+        path = self.log_path(self.generation)
+        if not os.path.exists(path):
+            return 0
+        applied = 0
+        with open(path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                # 只处理完整的行，写了一半的行留到下次
+                if not line.endswith(b'\n'):
+                    break
+                self._offset += len(line)
+                self._entries_since_snapshot += 1
+                entry = json.loads(line.decode('utf-8'))
+                if entry['op'] == 'upsert':
+                    kb.upsert_book_to_kb(entry['book'], log=False)
+                elif entry['op'] == 'remove':
+                    kb.remove_book_from_kb(entry['id'], log=False)
+                applied += 1
+        return applied
+
+    def append(self, kb, entry):
+        """追加一条变更；日志过长时生成新快照"""
+        with self._lock:
+            line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+            with open(self.log_path(self.generation), 'ab') as f:
+                f.write(line)
+            # 重放到日志末尾：先补上其他进程在这之前追加的变更，再重放自己刚写的这一行。
+            # 自己这一行必须重放：补上的旧变更可能覆盖了同一本书，重放后以日志顺序为准；
+            # 没有被覆盖时指纹相同，upsert 直接跳过，不会重新分析
+            self._replay(kb)
+            if self._entries_since_snapshot >= self.compact_after:
+                self.save_snapshot(kb)
+
+    def compact(self, kb):
+        """快照之后有新的变更时生成新快照；全量核对之后调用，下次启动直接加载三元组，无需重放日志重新分析"""
+        with self._lock:
+            if self._entries_since_snapshot:
+                self.save_snapshot(kb)
+
+    def save_snapshot(self, kb):
+        """把当前书籍三元组写成新一代快照，原子替换旧快照"""
+        with self._lock:
+            generation = self.generation + 1
+            snapshot = {
+                'generation': generation,
+                'triples': kb.get_book_triples(),
+                'fingerprints': dict(kb.fingerprints)
+            }
+            tmp_path = f'{self.snapshot_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.snapshot_path)
+
+            tmp_path = f'{self.current_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(str(generation))
+            os.replace(tmp_path, self.current_path)
+
+            # 删除两代之前的日志，上一代的日志留给还没切换快照的进程
+            old_log = self.log_path(self.generation - 1)
+            if os.path.exists(old_log):
+                os.remove(old_log)
+
+            self.generation = generation
+            self._offset = 0
+            self._entries_since_snapshot = 0
+            print(f"[OK] 已保存知识库快照（第 {generation} 代，{len(kb.fingerprints)} 本书籍）")
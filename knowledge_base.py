@@ -5,9 +5,16 @@ WeBook 语义知识库
 
 from rdflib import Graph, Namespace, Literal, URIRef
 from rdflib.namespace import RDF, RDFS, XSD
-import jieba
 import re
 import json
+import hashlib
+import threading
+from config import Config
+from token_cache import get_token_cache
+from literal_index import LiteralIndex
+from suggestion_index import SuggestionIndex
+from kb_store import KnowledgeBaseStore
+from startup import timed
 
 class WeBookKnowledgeBase:
     """WeBook语义知识库管理类"""
@@ -22,6 +29,20 @@ class WeBookKnowledgeBase:
         self.CATEGORY = Namespace("http://webook.com/resource/category/")
         self.AUTHOR = Namespace("http://webook.com/resource/author/")
         
+        # 书名、描述、关键词等字面量的子串索引，供SPARQL搜索定位候选书籍
+        self.literal_index = LiteralIndex()
+        self.indexed_properties = {
+            'title': self.WB.hasTitle,
+            'description': self.WB.hasDescription,
+            'keyword': self.WB.hasKeyword,
+            'language': self.WB.hasLanguage
+        }
+        
+        # 书籍ID -> 书籍数据指纹，数据未变时跳过重新分析
+        self.fingerprints = {}
+        # 可选的持久化存储（快照 + 变更日志）
+        self.store = None
+        
         # 绑定命名空间前缀
         self.g.bind("wb", self.WB)
         self.g.bind("book", self.BOOK)
@@ -32,6 +53,13 @@ class WeBookKnowledgeBase:
         self.init_ontology()
         self.init_knowledge_rules()
         
+        # 搜索建议前缀索引：同义词、分类关键词，以及各书籍的书名和关键词
+        self.suggestion_index = SuggestionIndex()
+        for main_term, synonyms in self.synonyms.items():
+            self.suggestion_index.add_vocabulary([main_term] + synonyms)
+        for keywords in self.category_keywords.values():
+            self.suggestion_index.add_vocabulary(keywords)
+        
     def init_ontology(self):
         """初始化本体结构 - 定义实体、属性和关系"""
         
@@ -269,14 +297,111 @@ class WeBookKnowledgeBase:
         # 智能分析和推理
         self.analyze_and_enrich_book(book_uri, book_data)
         
+        self.index_book_literals(book_uri)
+        
+        return book_uri
+    
+    def index_book_literals(self, book_uri):
+        """把书籍的文本字面量写入子串索引，书名和关键词写入搜索建议索引"""
+        self.literal_index.remove_book(book_uri)
+        for field, predicate in self.indexed_properties.items():
+            for value in self.g.objects(book_uri, predicate):
+                self.literal_index.add(book_uri, field, value)
+        self.suggestion_index.set_book(book_uri, [
+            str(value) for predicate in (self.WB.hasTitle, self.WB.hasKeyword)
+            for value in self.g.objects(book_uri, predicate)
+        ])
+    
+    def rebuild_literal_index(self):
+        """根据图中现有书籍重建子串索引和搜索建议索引"""
+        self.literal_index.clear()
+        self.suggestion_index.clear_books()
+        for book_uri in self.g.subjects(RDF.type, self.WB.Book):
+            self.index_book_literals(book_uri)
+    
+    def book_fingerprint(self, book_data):
+        """书籍数据的指纹"""
+        payload = json.dumps(book_data, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    
+    def remove_book_from_kb(self, book_id, log=True):
+        """从知识库中移除书籍的所有三元组（包括指向该书籍的关系）"""
+        book_uri = URIRef(f"{self.BOOK}{book_id}")
+        self.g.remove((book_uri, None, None))
+        self.g.remove((None, None, book_uri))
+        self.literal_index.remove_book(book_uri)
+        self.suggestion_index.remove_book(book_uri)
+        if self.fingerprints.pop(str(book_id), None) is not None and log and self.store:
+            self.store.append(self, {'op': 'remove', 'id': book_id})
         return book_uri
     
+    def upsert_book_to_kb(self, book_data, log=True):
+        """更新书籍：先移除旧的三元组再重新添加，避免旧标题、关键词和分类残留；数据未变时直接跳过"""
+        book_id = str(book_data['id'])
+        fingerprint = self.book_fingerprint(book_data)
+        if self.fingerprints.get(book_id) == fingerprint:
+            return URIRef(f"{self.BOOK}{book_id}")
+        
+        self.remove_book_from_kb(book_data['id'], log=False)
+        book_uri = self.add_book_to_kb(book_data)
+        self.fingerprints[book_id] = fingerprint
+        if log and self.store:
+            self.store.append(self, {'op': 'upsert', 'book': book_data})
+        return book_uri
+    
+    def reconcile_books(self, books):
+        """
+        让知识库中的书籍与给定的书籍数据列表一致
+        
+        只分析新增或数据有变化的书籍，并移除列表中已不存在的书籍
+        """
+        live_ids = {str(book_data['id']) for book_data in books}
+        for book_id in list(self.fingerprints):
+            if book_id not in live_ids:
+                self.remove_book_from_kb(book_id)
+        # 没有指纹的书籍（例如旧版本直接添加的）也一并清理
+        for book_uri in list(self.g.subjects(RDF.type, self.WB.Book)):
+            book_id = str(book_uri).split('/')[-1]
+            if book_id not in self.fingerprints:
+                self.remove_book_from_kb(book_id, log=False)
+        for book_data in books:
+            self.upsert_book_to_kb(book_data)
+    
+    def clear_books(self):
+        """移除知识库中的全部书籍，保留本体和分类结构"""
+        for book_uri in list(self.g.subjects(RDF.type, self.WB.Book)):
+            self.g.remove((book_uri, None, None))
+            self.g.remove((None, None, book_uri))
+        self.literal_index.clear()
+        self.suggestion_index.clear_books()
+        self.fingerprints = {}
+    
+    def get_book_triples(self):
+        """取出全部书籍的三元组，用于保存快照"""
+        triples = []
+        for book_uri in self.g.subjects(RDF.type, self.WB.Book):
+            triples.extend(self.g.triples((book_uri, None, None)))
+        return triples
+    
+    def load_book_triples(self, triples, fingerprints):
+        """用快照中的三元组替换当前全部书籍"""
+        self.clear_books()
+        for triple in triples:
+            self.g.add(triple)
+        self.fingerprints = dict(fingerprints)
+        self.rebuild_literal_index()
+    
+    def attach_store(self, store):
+        """挂载持久化存储：加载快照和变更日志，之后的增删改都会写入日志"""
+        self.store = store
+        store.open(self)
+    
     def analyze_and_enrich_book(self, book_uri, book_data):
         """智能分析书籍并丰富知识库"""
         text = f"{book_data['name']} {book_data.get('description', '')}".lower()
         
         # 1. 提取和添加关键词
-        keywords = self.extract_smart_keywords(text)
+        keywords = self.extract_smart_keywords(text, book_id=book_data['id'])
         for keyword in keywords[:15]:  # 限制关键词数量
             self.g.add((book_uri, self.WB.hasKeyword, Literal(keyword)))
         
@@ -297,12 +422,12 @@ class WeBookKnowledgeBase:
         for language in languages:
             self.g.add((book_uri, self.WB.hasLanguage, Literal(language)))
     
-    def extract_smart_keywords(self, text):
-        """智能提取关键词"""
+    def extract_smart_keywords(self, text, book_id=None):
+        """智能提取关键词；传入 book_id 时分词结果走共享分词缓存"""
         keywords = set()
         
         # 中文分词
-        chinese_words = jieba.lcut(text)
+        chinese_words = get_token_cache().lcut(text, book_id)
         for word in chinese_words:
             if len(word) > 1 and word not in ['的', '是', '在', '和', '与', '等', '了', '也', '就']:
                 keywords.add(word.lower())
@@ -463,5 +588,19 @@ class WeBookKnowledgeBase:
                 'category_details': []
             }
 
-# 创建全局知识库实例
-knowledge_base = WeBookKnowledgeBase()
\ No newline at end of file
+# 全局知识库实例，第一次使用时才创建
+_knowledge_base = None
+_knowledge_base_lock = threading.Lock()
+
+def get_knowledge_base():
+    """获取知识库实例；首次调用时构建本体，并从持久化目录加载书籍"""
+    global _knowledge_base
+    if _knowledge_base is None:
+        with _knowledge_base_lock:
+            if _knowledge_base is None:
+                with timed('knowledge_base'):
+                    kb = WeBookKnowledgeBase()
+                    if Config.KB_STORE_DIR:
+                        kb.attach_store(KnowledgeBaseStore(Config.KB_STORE_DIR, Config.KB_SNAPSHOT_EVERY))
+                _knowledge_base = kb
+    return _knowledge_base
@@ -0,0 +1,88 @@
+"""
+书籍字面量索引模块
+对书名、描述、关键词等文本字面量建立 n-gram 子串索引，
+SPARQL 搜索先用它定位候选书籍，再只取这些书籍的属性
+"""
+import threading
+
+
+class LiteralIndex:
+    """字面量 n-gram 子串索引"""
+
+    def __init__(self, n=2):
+        self.n = n
+        # n-gram -> 含有该片段的书籍URI集合
+        self.grams = {}
+        # 书籍URI -> {字段名: [小写字面量, ...]}
+        self.literals = {}
+        self._lock = threading.RLock()
+
+    def _grams(self, text):
+        """切出文本的所有 n-gram；短于 n 的文本整体作为一个片段"""
+        if len(text) < self.n:
+            return {text} if text else set()
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, book_uri, field, value):
+        """为书籍的某个字段添加一个字面量"""
+        text = str(value).lower()
+        with self._lock:
+            self.literals.setdefault(book_uri, {}).setdefault(field, []).append(text)
+            for gram in self._grams(text):
+                self.grams.setdefault(gram, set()).add(book_uri)
+
+    def remove_book(self, book_uri):
+        """移除书籍的全部字面量"""
+        with self._lock:
+            fields = self.literals.pop(book_uri, None)
+            if not fields:
+                return
+            for texts in fields.values():
+                for text in texts:
+                    for gram in self._grams(text):
+                        books = self.grams.get(gram)
+                        if books is not None:
+                            books.discard(book_uri)
+                            if not books:
+                                del self.grams[gram]
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self.grams = {}
+            self.literals = {}
+
+    def find_books(self, terms, fields):
+        """
+        查找指定字段中包含任一查询词（子串匹配，不区分大小写）的书籍
+
+        Args:
+            terms: 查询词列表
+            fields: 参与匹配的字段名
+
+        Returns:
+            set: 书籍URI集合
+        """
+        matched = set()
+        with self._lock:
+            for term in terms:
+                term = term.lower()
+                if not term:
+                    continue
+                # 先用 n-gram 倒排求交集得到候选，再逐个核对真实子串
+                if len(term) < self.n:
+                    candidates = self.literals.keys()
+                else:
+                    candidates = None
+                    for gram in self._grams(term):
+                        books = self.grams.get(gram, set())
+                        candidates = books if candidates is None else candidates & books
+                        if not candidates:
+                            break
+                for book_uri in candidates or ():
+                    if book_uri in matched:
+                        continue
+                    book_fields = self.literals.get(book_uri, {})
+                    if any(term in text for field in fields for text in book_fields.get(field, ())):
+                        matched.add(book_uri)
+        return matched
@@ -0,0 +1,53 @@
+"""add indexes for hot queries
+
+Revision ID: 2efbe660327a
+Revises: 
+Create Date: 2026-10-18 10:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2efbe660327a'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# 表名 -> [(索引名, 列)]
+INDEXES = {
+    'products': [('ix_products_user_id_is_sold', ['user_id', 'is_sold'])],
+    'orders': [('ix_orders_user_id_reviewed', ['user_id', 'reviewed'])],
+    'reviews': [
+        ('ix_reviews_reviewee_id_created_at', ['reviewee_id', 'created_at']),
+        ('ix_reviews_order_id', ['order_id']),
+    ],
+}
+
+
+def upgrade():
+    # 表由 db.create_all() 创建，新库建表时已经带上这些索引，只创建缺少的；
+    # 不用 if_not_exists：MySQL 不支持 CREATE INDEX IF NOT EXISTS
+    inspector = sa.inspect(op.get_bind())
+    for table, indexes in INDEXES.items():
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        missing = [(name, columns) for name, columns in indexes if name not in existing]
+        if not missing:
+            continue
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name, columns in missing:
+                batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_reviews_order_id'))
+        batch_op.drop_index('ix_reviews_reviewee_id_created_at')
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_user_id_reviewed')
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_user_id_is_sold')
@@ -0,0 +1,31 @@
+"""add image blobs
+
+Revision ID: 5b7d2c9e41af
+Revises: e08c8f905d2c
+Create Date: 2026-10-18 15:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7d2c9e41af'
+down_revision = 'e08c8f905d2c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() 可能已经建好了这张表；已有图片由 scripts/migrate_images_to_blobs.py 迁移并统计引用
+    if 'image_blobs' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('image_blobs',
+            sa.Column('path', sa.String(length=200), nullable=False),
+            sa.Column('ref_count', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('path')
+        )
+
+
+def downgrade():
+    op.drop_table('image_blobs')
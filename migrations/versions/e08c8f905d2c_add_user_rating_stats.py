@@ -0,0 +1,58 @@
+"""add user rating stats
+
+Revision ID: e08c8f905d2c
+Revises: 2efbe660327a
+Create Date: 2026-10-18 11:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e08c8f905d2c'
+down_revision = '2efbe660327a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() 可能已经建好了这张表
+    if 'user_rating_stats' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('user_rating_stats',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('review_count', sa.Integer(), nullable=False),
+            sa.Column('rating_sum', sa.Integer(), nullable=False),
+            sa.Column('positive_count', sa.Integer(), nullable=False),
+            sa.Column('star_1', sa.Integer(), nullable=False),
+            sa.Column('star_2', sa.Integer(), nullable=False),
+            sa.Column('star_3', sa.Integer(), nullable=False),
+            sa.Column('star_4', sa.Integer(), nullable=False),
+            sa.Column('star_5', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('user_id')
+        )
+
+    # 根据已有评价回填汇总（跳过已有汇总的用户）；
+    # 通过派生表做反连接：MySQL 不允许在 INSERT 的子查询中直接读取目标表（错误 1093）
+    op.execute("""
+        INSERT INTO user_rating_stats
+            (user_id, review_count, rating_sum, positive_count, star_1, star_2, star_3, star_4, star_5)
+        SELECT r.reviewee_id,
+               COUNT(*),
+               SUM(r.rating),
+               SUM(CASE WHEN r.rating >= 4 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN r.rating = 1 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN r.rating = 2 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN r.rating = 3 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN r.rating = 4 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN r.rating = 5 THEN 1 ELSE 0 END)
+        FROM reviews r
+        LEFT JOIN (SELECT user_id FROM user_rating_stats) s ON s.user_id = r.reviewee_id
+        WHERE r.reviewee_id IS NOT NULL
+          AND s.user_id IS NULL
+        GROUP BY r.reviewee_id
+    """)
+
+
+def downgrade():
+    op.drop_table('user_rating_stats')
@@ -0,0 +1,73 @@
+"""
+Check that the hot queries of the WeBook app are served by indexes.
+Usage: python scripts/check_query_plans.py
+
+Runs EXPLAIN on each hot query against the configured database and exits
+with status 1 if any of them falls back to a full table or index scan, or a filesort.
+Run `flask db upgrade` first so existing databases have the indexes.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+
+from app import app, db, Product, Order, Review
+
+
+def hot_queries():
+    """(名称, 查询) 列表，参数值只用于生成执行计划"""
+    return [
+        ('homepage: uploaded products', Product.query.filter_by(user_id=1)),
+        ('homepage: sold products', Product.query.filter_by(user_id=1, is_sold=True)),
+        ('homepage: orders', Order.query.filter_by(user_id=1)),
+        ('reviews: pending orders', Order.query.filter_by(user_id=1, reviewed=False)),
+        ('credit/reviews: reviews by reviewee',
+         Review.query.filter_by(reviewee_id=1).order_by(Review.created_at.desc(), Review.id.desc()).limit(21)),
+        ('submit_review: duplicate review check', Review.query.filter_by(order_id=1)),
+    ]
+
+
+def compile_sql(query):
+    return str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+
+
+def plan_problems(sql):
+    """返回执行计划中的问题列表（全表扫描、全索引扫描、额外排序）"""
+    problems = []
+    with db.engine.connect() as conn:
+        if db.engine.dialect.name == 'sqlite':
+            details = [row[-1] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+            # 按索引查找（SEARCH）过的表；SCAN ... USING (COVERING) INDEX 仍是逐行扫描整个索引，同样算问题
+            searched = {detail.split()[1] for detail in details if detail.startswith('SEARCH')}
+            for detail in details:
+                if detail.startswith('SCAN') and detail.split()[1] not in searched:
+                    problems.append(detail)
+                elif 'USE TEMP B-TREE' in detail:
+                    problems.append(detail)
+        else:
+            for row in conn.execute(text(f'EXPLAIN {sql}')).mappings():
+                if row['type'] == 'ALL':
+                    problems.append(f"full scan on {row['table']}")
+                elif row['type'] == 'index':
+                    problems.append(f"full index scan on {row['table']}")
+                if 'filesort' in (row['Extra'] or ''):
+                    problems.append(f"filesort on {row['table']}")
+    return problems
+
+
+def main():
+    failed = False
+    with app.app_context():
+        for name, query in hot_queries():
+            problems = plan_problems(compile_sql(query))
+            if problems:
+                failed = True
+                print(f"[FAIL] {name}: {'; '.join(problems)}")
+            else:
+                print(f"[OK] {name}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""
+Generate thumbnail and WebP/JPEG derivatives for existing product images.
+Usage: python scripts/generate_image_derivatives.py [--force]
+
+New uploads are processed in the background by the app; run this once to
+backfill images that were uploaded before the pipeline existed (and after
+changing IMAGE_QUALITY or the sizes, with --force to regenerate).
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, Product, Order
+from image_pipeline import get_image_pipeline, normalize_image_path
+
+
+def main(force=False):
+    pipeline = get_image_pipeline()
+    with app.app_context():
+        paths = {normalize_image_path(row.image) for row in Product.query.with_entities(Product.image)}
+        paths |= {normalize_image_path(row.product_image) for row in Order.query.with_entities(Order.product_image)}
+    paths.discard('')
+
+    missing = {path for path in paths if not os.path.exists(os.path.join(pipeline.static_folder, path))}
+    for path in sorted(missing):
+        print(f"[INFO] 图片不存在，跳过: {path}")
+    created, failed = pipeline.process_all(sorted(paths - missing), force=force)
+    print(f"[OK] 共 {len(paths)} 张图片，新生成 {created} 个派生图，失败 {len(failed)} 张")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main(force='--force' in sys.argv[1:]))
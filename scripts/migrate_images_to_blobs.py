@@ -0,0 +1,79 @@
+"""
+Move existing product images into the content-addressed image store.
+Usage: python scripts/migrate_images_to_blobs.py [--delete-originals]
+
+Copies every image referenced by a product or order into static/blobs/
+(identical files are stored once), rewrites Product.image and
+Order.product_image to the blob paths, recounts the image_blobs table from
+scratch and removes blobs that nothing references. Safe to run repeatedly.
+With --delete-originals, migrated files under static/uploads/ are removed;
+static/images/ is left alone because pages link to it directly.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from collections import Counter
+
+from app import app, db, Product, Order, ImageBlob
+from image_pipeline import normalize_image_path
+from image_store import get_image_store, UnsupportedImageError
+
+
+def migrate_paths(store):
+    """把旧路径的图片存入 blob 存储，返回 {旧路径: blob 路径}"""
+    paths = {normalize_image_path(row.image) for row in Product.query.with_entities(Product.image)}
+    paths |= {normalize_image_path(row.product_image) for row in Order.query.with_entities(Order.product_image)}
+    mapping = {}
+    for path in sorted(paths):
+        if not path or store.is_blob(path):
+            continue
+        source = os.path.join(store.static_folder, path)
+        if not os.path.exists(source):
+            print(f"[INFO] 图片不存在，保留原路径: {path}")
+            continue
+        try:
+            mapping[path] = store.save_file(source)
+        except UnsupportedImageError:
+            print(f"[INFO] 不是支持的图片格式，保留原路径: {path}")
+    return mapping
+
+
+def main(delete_originals=False):
+    store = get_image_store()
+    with app.app_context():
+        mapping = migrate_paths(store)
+        for product in Product.query.all():
+            product.image = mapping.get(normalize_image_path(product.image), product.image)
+        for order in Order.query.all():
+            order.product_image = mapping.get(normalize_image_path(order.product_image), order.product_image)
+        db.session.commit()
+
+        # 引用计数以数据库中的实际引用为准重新统计
+        counts = Counter(normalize_image_path(row.image) for row in Product.query.with_entities(Product.image))
+        counts.update(normalize_image_path(row.product_image) for row in Order.query.with_entities(Order.product_image))
+        ImageBlob.query.delete()
+        for path, count in counts.items():
+            if store.is_blob(path):
+                db.session.add(ImageBlob(path=path, ref_count=count))
+        db.session.commit()
+
+        referenced = {path for path in counts if store.is_blob(path)}
+        removed = 0
+        for path in store.iter_blobs():
+            if path not in referenced and store.delete(path):
+                removed += 1
+
+    print(f"[OK] 迁移 {len(mapping)} 张图片，存储中共 {len(set(mapping.values()) | referenced)} 个不重复的图片，回收 {removed} 个无引用的图片")
+
+    if delete_originals:
+        deleted = 0
+        for path in mapping:
+            if path.startswith('uploads/'):
+                os.remove(os.path.join(store.static_folder, path))
+                deleted += 1
+        print(f"[OK] 已删除 {deleted} 个 static/uploads/ 下的原文件")
+
+
+if __name__ == '__main__':
+    main(delete_originals='--delete-originals' in sys.argv[1:])
@@ -0,0 +1,212 @@
+"""
+搜索结果缓存模块
+按（搜索方式, 规范化后的查询词, 结果数量）缓存搜索结果中的商品ID和分数：
+- 进程内 LRU 缓存，条目超过有效期后失效
+- 每次商品写入提交后目录版本号加一，旧版本的缓存条目全部失效
+- 可选的 SQLite 文件共享层：多个工作进程共用缓存条目和目录版本号；
+  由各进程内存索引算出的结果（各进程索引的同步进度不同）只进进程内缓存
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalogue_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO catalogue_version (id, version) VALUES (1, 0);
+CREATE TABLE IF NOT EXISTS search_cache (
+    cache_key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    value TEXT NOT NULL
+);
+"""
+
+
+def normalize_query(query):
+    """全角转半角、转小写、合并空白，使写法不同的同一查询命中同一条缓存"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', query)).strip().lower()
+
+
+class SearchCache:
+    """带有效期和LRU淘汰的搜索结果缓存"""
+
+    def __init__(self, max_size=1000, ttl=300, shared_path=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        # SQLite 共享层文件路径，为空时只使用进程内缓存
+        self.shared_path = shared_path or None
+        # 缓存键 -> (目录版本号, 过期时间, 结果)
+        self._entries = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if self.shared_path:
+            os.makedirs(os.path.dirname(self.shared_path) or '.', exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(SCHEMA)
+            finally:
+                conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.shared_path, timeout=5, isolation_level=None)
+
+    def _shared(self, sql, params=()):
+        """在共享层执行一条语句；共享层出错时只记录，不影响搜索"""
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchone()
+        except sqlite3.Error as e:
+            print(f"[ERROR] 搜索缓存共享层出错: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def current_version(self):
+        """当前目录版本号；启用共享层时以共享层为准，可看到其他进程的写入"""
+        if self.shared_path:
+            row = self._shared('SELECT version FROM catalogue_version WHERE id = 1')
+            if row:
+                return row[0]
+        return self._version
+
+    def bump_version(self, shared=True):
+        """
+        商品写入提交后调用，使所有已缓存的结果失效
+
+        shared=False 时只清空进程内缓存：其他进程的修改已由写入的进程递增过共享层的版本号
+        """
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self.invalidations += 1
+        if self.shared_path and shared:
+            self._shared('UPDATE catalogue_version SET version = version + 1 WHERE id = 1')
+            self._shared('DELETE FROM search_cache WHERE version < (SELECT version FROM catalogue_version WHERE id = 1)')
+
+    def make_key(self, mode, query, limit):
+        return json.dumps([mode, normalize_query(query), limit], ensure_ascii=False)
+
+    def get(self, key, version, shared=True):
+        """
+        读取缓存；shared=False 时只查进程内缓存
+
+        Returns:
+            list | None: 缓存的结果；未命中返回 None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == version and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.local_hits += 1
+                    return entry[2]
+                del self._entries[key]
+
+        if self.shared_path and shared:
+            row = self._shared(
+                'SELECT value, expires_at FROM search_cache WHERE cache_key = ? AND version = ? AND expires_at > ?',
+                (key, version, now)
+            )
+            if row:
+                value = json.loads(row[0])
+                self._store_local(key, version, row[1], value)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, version, value, shared=True):
+        """
+        写入缓存；shared=False 时只写进程内缓存
+
+        version 必须是计算结果之前读取的版本号：计算期间若有商品写入，这条结果随即失效
+        """
+        expires_at = time.time() + self.ttl
+        self._store_local(key, version, expires_at, value)
+        if self.shared_path and shared:
+            self._shared(
+                'INSERT OR REPLACE INTO search_cache (cache_key, version, expires_at, value) VALUES (?, ?, ?, ?)',
+                (key, version, expires_at, json.dumps(value, ensure_ascii=False))
+            )
+
+    def _store_local(self, key, version, expires_at, value):
+        with self._lock:
+            self._entries[key] = (version, expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, mode, query, limit, compute, shared=True):
+        """
+        命中缓存直接返回，否则调用 compute() 计算并缓存
+
+        shared=False 表示结果依赖本进程的内存索引，不与其他进程共享
+
+        Returns:
+            list: compute() 的返回值（需可序列化为 JSON）
+        """
+        key = self.make_key(mode, query, limit)
+        version = self.current_version()
+        value = self.get(key, version, shared)
+        if value is None:
+            value = compute()
+            self.set(key, version, value, shared)
+        return value
+
+    def clear(self):
+        """清空进程内缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            hits = self.local_hits + self.shared_hits
+            total = hits + self.misses
+            stats = {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'local_hits': self.local_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': round(hits / total, 4) if total else 0.0,
+                'invalidations': self.invalidations,
+                'shared': bool(self.shared_path)
+            }
+        stats['version'] = self.current_version()
+        return stats
+
+
+# 全局实例，第一次使用时才创建
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+def get_search_cache():
+    """获取搜索结果缓存实例"""
+    global _search_cache
+    if _search_cache is None:
+        with _search_cache_lock:
+            if _search_cache is None:
+                _search_cache = SearchCache(Config.SEARCH_CACHE_SIZE, Config.SEARCH_CACHE_TTL,
+                                            Config.SEARCH_CACHE_PATH)
+    return _search_cache
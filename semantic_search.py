@@ -0,0 +1,330 @@
+"""
+向量语义检索模块
+用句向量模型（Config.SEMANTIC_MODEL）把商品文本编码为向量，存入 FAISS 索引做近似最近邻检索：
+- 索引保存在 Config.FAISS_INDEX_PATH，元数据（模型名、各商品文本指纹）保存在同目录的 *_metadata.pkl
+- 重启后只为新增或文本有变化的商品重新编码
+- 索引文件以内存映射方式只读打开，更新时整体替换文件，多个工作进程共享同一份页缓存
+- 测试时可设置 EMBEDDING_BACKEND=hashing 使用确定性的哈希编码器，无需下载模型
+- NumPy、faiss 在用到时才导入，导入 app 时不加载
+"""
+import hashlib
+import os
+import pickle
+import threading
+from contextlib import contextmanager
+
+from config import Config
+from token_cache import get_token_cache
+from startup import timed
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只保证进程内的写入互斥
+    fcntl = None
+
+
+class SentenceTransformerEmbedder:
+    """sentence-transformers 句向量编码器（CPU）"""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.name = model_name
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=64):
+        import numpy as np
+        vectors = self.model.encode(list(texts), batch_size=batch_size,
+                                    normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype='float32')
+
+
+class HashingEmbedder:
+    """确定性的哈希编码器：把分词结果散列到固定维度，供测试和无模型环境使用"""
+
+    def __init__(self, dim):
+        self.name = f'hashing-{dim}'
+        self.dim = dim
+
+    def encode(self, texts, batch_size=64):
+        import numpy as np
+        vectors = np.zeros((len(texts), self.dim), dtype='float32')
+        for row, text in enumerate(texts):
+            for token in get_token_cache().lcut(text.lower()):
+                if not token.strip():
+                    continue
+                digest = hashlib.md5(token.encode('utf-8')).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dim
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+            norm = np.linalg.norm(vectors[row])
+            if norm:
+                vectors[row] /= norm
+        return vectors
+
+
+def create_embedder():
+    """根据配置创建编码器"""
+    if Config.EMBEDDING_BACKEND == 'hashing':
+        return HashingEmbedder(Config.VECTOR_DIM)
+    embedder = SentenceTransformerEmbedder(Config.SEMANTIC_MODEL)
+    if embedder.dim != Config.VECTOR_DIM:
+        print(f"[INFO] 模型 {embedder.name} 的向量维度为 {embedder.dim}，与 VECTOR_DIM={Config.VECTOR_DIM} 不一致，以模型为准")
+    return embedder
+
+
+def product_text(product):
+    """参与编码的商品文本"""
+    return f"{product.name} {product.description or ''}".strip()
+
+
+class VectorSearchService:
+    """基于 FAISS 的向量检索服务
+
+    已发布的索引文件只读打开（mmap=True 时内存映射，多个工作进程共享同一份页缓存）。
+    写入时在跨进程文件锁内载入最新索引的可写副本，修改后写临时文件并原子替换，
+    各进程检索前发现文件已替换就重新打开。
+    编码和写文件期间不持有检索用的锁，self._lock 只保护 self.index 的切换，重建索引时检索不受阻塞。
+    """
+
+    def __init__(self, index_path, embedder_factory=create_embedder, batch_size=64, mmap=True):
+        self.index_path = index_path
+        self.metadata_path = os.path.splitext(index_path)[0] + '_metadata.pkl'
+        self.lock_path = index_path + '.lock'
+        self.batch_size = batch_size
+        self.mmap = mmap
+        self._embedder_factory = embedder_factory
+        self.embedder = None
+        self.index = None
+        # 当前打开的索引文件标识 (inode, 修改时间, 大小)，用于发现其他进程发布的新索引
+        self._published = None
+        # faiss 或编码模型不可用时为 False，调用方应退回其他检索方式
+        self.available = False
+        self._lock = threading.RLock()
+        # 进程内的写入互斥（没有 fcntl 的平台上文件锁不起作用）
+        self._write_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            import faiss
+            self._faiss = faiss
+            with timed('embedding_model'):
+                self.embedder = self._embedder_factory()
+        except Exception as e:
+            print(f"[ERROR] 向量检索不可用（{e}），语义搜索将使用倒排索引")
+            return
+        self.available = True
+        self.index = self._new_index()
+        self._refresh()
+
+    def _new_index(self):
+        # 向量已归一化，内积即余弦相似度；IDMap 让商品ID直接作为向量ID，便于单本删除
+        # （不用 IDMap2：它在每个进程里额外维护一份ID反查表，无法共享）
+        return self._faiss.IndexIDMap(self._faiss.IndexFlatIP(self.embedder.dim))
+
+    def _fingerprint(self, text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _file_identity(self):
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _read_index(self, writable=False):
+        flags = 0
+        if self.mmap and not writable:
+            # IO_FLAG_MMAP_IFC 连同 Flat 索引的向量一起映射；旧版 faiss 只有 IO_FLAG_MMAP
+            flags = getattr(self._faiss, 'IO_FLAG_MMAP_IFC', self._faiss.IO_FLAG_MMAP) | self._faiss.IO_FLAG_READ_ONLY
+        return self._faiss.read_index(self.index_path, flags)
+
+    def _refresh(self):
+        """索引文件被替换（或首次出现）时重新打开；在锁外读取文件，只在切换时持锁"""
+        identity = self._file_identity()
+        if identity is None or identity == self._published:
+            return
+        try:
+            index = self._read_index()
+        except Exception as e:
+            print(f"[ERROR] 加载向量索引失败: {e}")
+            index = None
+        with self._lock:
+            if identity == self._published:
+                # 其他线程已经切换过
+                return
+            first_open = self._published is None
+            self._published = identity
+            if index is None:
+                return
+            if index.d != self.embedder.dim:
+                print("[INFO] 向量索引与当前模型维度不一致，等待重新编码")
+                return
+            self.index = index
+        if first_open:
+            print(f"[OK] 已加载向量索引，共 {index.ntotal} 本书籍{'（内存映射）' if self.mmap else ''}")
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程写锁，避免多个工作进程同时发布索引时互相覆盖"""
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        with open(self.lock_path, 'a') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_fingerprints(self):
+        """读取已发布索引的元数据；不存在或与当前模型不匹配时返回 None"""
+        if self._file_identity() is None or not os.path.exists(self.metadata_path):
+            return None
+        try:
+            with open(self.metadata_path, 'rb') as f:
+                metadata = pickle.load(f)
+        except Exception as e:
+            print(f"[ERROR] 读取向量索引元数据失败: {e}")
+            return None
+        if metadata['model'] != self.embedder.name:
+            print("[INFO] 向量索引与当前模型不匹配，将重新编码全部商品")
+            return None
+        return metadata['fingerprints']
+
+    def _update(self, plan, rebuild=False):
+        """
+        修改并发布索引
+
+        Args:
+            plan: 函数，参数为已发布索引的 {商品ID: 文本指纹}，返回 (需要编码的商品列表, 需要移除的商品ID)
+            rebuild: 为 True 时从空索引开始
+        """
+        with self._write_lock, self._file_lock():
+            fingerprints = None if rebuild else self._read_fingerprints()
+            index = None
+            if fingerprints is not None:
+                to_add, to_remove = plan(fingerprints)
+                if not to_add and not to_remove:
+                    return
+                # 可写副本完整读入内存，发布后即释放；已映射的索引不能原地修改
+                index = self._read_index(writable=True)
+                if index.ntotal != len(fingerprints):
+                    print("[INFO] 向量索引与元数据不一致，将重新编码")
+                    index = None
+            if index is None:
+                fingerprints = {}
+                index = self._new_index()
+                to_add, to_remove = plan(fingerprints)
+            self._build(index, fingerprints, to_add, to_remove)
+
+    def _build(self, index, fingerprints, to_add, to_remove):
+        """在可写副本上执行移除和分批编码，然后发布"""
+        import numpy as np
+        to_remove = [pid for pid in set(to_remove) | {product.id for product in to_add} if pid in fingerprints]
+        if to_remove:
+            index.remove_ids(np.asarray(to_remove, dtype='int64'))
+            for product_id in to_remove:
+                del fingerprints[product_id]
+
+        for start in range(0, len(to_add), self.batch_size):
+            batch = to_add[start:start + self.batch_size]
+            texts = [product_text(product) for product in batch]
+            vectors = self.embedder.encode(texts, batch_size=self.batch_size)
+            index.add_with_ids(vectors, np.asarray([product.id for product in batch], dtype='int64'))
+            for product, text in zip(batch, texts):
+                fingerprints[product.id] = self._fingerprint(text)
+
+        self._publish(index, fingerprints)
+
+    def _publish(self, index, fingerprints):
+        """先写临时文件再原子替换，正在检索的进程仍使用旧文件直到下次检索时切换"""
+        tmp_path = f'{self.metadata_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'model': self.embedder.name, 'fingerprints': fingerprints}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.metadata_path)
+
+        tmp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        self._faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+
+        if self.mmap:
+            # 丢弃可写副本，改为映射刚发布的文件
+            self._refresh()
+        else:
+            with self._lock:
+                self.index = index
+                self._published = self._file_identity()
+
+    def rebuild_index(self, products):
+        """重新编码全部商品并发布"""
+        if not self.available:
+            return
+        products = list(products)
+        self._update(lambda fingerprints: (products, []), rebuild=True)
+        print(f"[OK] 向量索引重建完成，共 {len(products)} 本书籍")
+
+    def reconcile(self, products):
+        """与商品列表核对：只编码新增或文本有变化的商品，移除已不存在的商品"""
+        if not self.available:
+            return
+        products = list(products)
+
+        def plan(fingerprints):
+            changed = [product for product in products
+                       if fingerprints.get(product.id) != self._fingerprint(product_text(product))]
+            removed = set(fingerprints) - {product.id for product in products}
+            return changed, removed
+
+        self._update(plan)
+
+    def index_product(self, product):
+        """添加或更新单个商品并立即发布（每次都重写整个索引文件，批量变化请用 reconcile）"""
+        if not self.available:
+            return
+        fingerprint = self._fingerprint(product_text(product))
+        self._update(lambda fingerprints: ([product] if fingerprints.get(product.id) != fingerprint else [], []))
+
+    def remove_product(self, product_id):
+        """移除单个商品并立即发布（每次都重写整个索引文件，批量变化请用 reconcile）"""
+        if not self.available:
+            return
+        self._update(lambda fingerprints: ([], [product_id] if product_id in fingerprints else []))
+
+    def search_scores(self, query, top_k=10):
+        """
+        近似最近邻检索
+
+        Returns:
+            dict: 按相似度从高到低排列的 {product_id: score}
+        """
+        if not self.available:
+            return {}
+        query_vector = self.embedder.encode([query])
+        self._refresh()
+        with self._lock:
+            index = self.index
+        # 已发布的索引不再修改，切换后旧对象仍可安全检索完
+        if index.ntotal == 0:
+            return {}
+        scores, ids = index.search(query_vector, min(top_k, index.ntotal))
+        # 与查询不相关（相似度不为正）的商品不返回
+        return {int(pid): float(score) for pid, score in zip(ids[0], scores[0]) if pid != -1 and score > 0}
+
+
+# 全局实例，第一次使用时才创建（会加载编码模型）
+_vector_search = None
+_vector_search_lock = threading.Lock()
+
+def get_vector_search():
+    """获取向量检索服务实例"""
+    global _vector_search
+    if _vector_search is None:
+        with _vector_search_lock:
+            if _vector_search is None:
+                with timed('vector_search'):
+                    _vector_search = VectorSearchService(Config.FAISS_INDEX_PATH,
+                                                         batch_size=Config.EMBEDDING_BATCH_SIZE,
+                                                         mmap=Config.FAISS_MMAP)
+    return _vector_search
@@ -2,9 +2,28 @@
 轻量级语义搜索模块
 使用简单的文本相似度算法，无需下载 AI 模型
 """
+import heapq
 import re
+import threading
 from difflib import SequenceMatcher
 import jieba  # 中文分词，轻量级
+from token_cache import get_token_cache
+from startup import timed
+
+
+def iter_index_terms(tokens):
+    """
+    从分词结果中逐个取出用于检索的词（去掉空白和标点，保留重复以便统计词频）
+    
+    中文词额外加入相邻两字组合，使"数学"也能命中分成一个词的"高等数学"
+    """
+    for token in tokens:
+        if not token.strip() or re.fullmatch(r'[\W_]+', token):
+            continue
+        yield token
+        for run in re.findall(r'[\u4e00-\u9fff]{3,}', token):
+            for i in range(len(run) - 1):
+                yield run[i:i + 2]
 
 
 class SimpleSemanticSearch:
@@ -34,6 +53,58 @@ class SimpleSemanticSearch:
             '高级': ['进阶', '深入', '精通', '高手'],
             '实战': ['实践', '项目', '案例', '练习'],
         }
+        
+        # 倒排索引：词 -> 包含该词的商品ID集合
+        self.postings = {}
+        # 正排信息：商品ID -> {'text': 小写商品文本, 'tokens': 分词集合}
+        self.documents = {}
+        self._lock = threading.RLock()
+    
+    def tokenize(self, text, key=None):
+        """
+        分词，返回小写词集合；jieba 出错时退化为按空白切分
+        
+        key 为商品ID时结果进入共享分词缓存，同一商品文本只在编辑后重新分词
+        """
+        try:
+            return set(get_token_cache().lcut(text.lower(), key))
+        except:
+            return set(text.lower().split())
+    
+    def index_terms(self, tokens):
+        """从分词结果中取出用于倒排索引的词（去重），规则见 iter_index_terms"""
+        return set(iter_index_terms(tokens))
+    
+    def index_product(self, product):
+        """添加或更新单个商品的索引"""
+        text = f"{product.name} {product.description}".lower()
+        tokens = self.tokenize(text, key=product.id)
+        with self._lock:
+            self.remove_product(product.id)
+            self.documents[product.id] = {'text': text, 'tokens': tokens}
+            for term in self.index_terms(tokens):
+                self.postings.setdefault(term, set()).add(product.id)
+    
+    def remove_product(self, product_id):
+        """从索引中移除单个商品"""
+        with self._lock:
+            document = self.documents.pop(product_id, None)
+            if document is None:
+                return
+            for term in self.index_terms(document['tokens']):
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.discard(product_id)
+                    if not posting:
+                        del self.postings[term]
+    
+    def build_index(self, products):
+        """根据商品列表全量重建索引"""
+        with self._lock:
+            self.postings = {}
+            self.documents = {}
+            for product in products:
+                self.index_product(product)
     
     def expand_query(self, query):
         """
@@ -59,12 +130,13 @@ class SimpleSemanticSearch:
         
         return list(set(expanded_terms))  # 去重
     
-    def calculate_similarity(self, text1, text2):
+    def calculate_similarity(self, text1, text2, product_id=None):
         """
         计算两个文本的相似度
         
         Args:
             text1, text2: 要比较的文本
+            product_id: text2 所属商品ID，传入时 text2 的分词结果走共享缓存
             
         Returns:
             float: 相似度分数 (0-1)
@@ -75,7 +147,7 @@ class SimpleSemanticSearch:
         # 方法2：分词后的重叠度
         try:
             words1 = set(jieba.lcut(text1.lower()))
-            words2 = set(jieba.lcut(text2.lower()))
+            words2 = set(get_token_cache().lcut(text2.lower(), product_id))
             
             if len(words1) == 0 or len(words2) == 0:
                 similarity2 = 0
@@ -94,54 +166,93 @@ class SimpleSemanticSearch:
         # 综合两种相似度
         return max(similarity1, similarity2)
     
-    def search(self, query, products, top_k=10):
+    def search(self, query, products=None, top_k=10):
         """
         执行语义搜索
         
         Args:
             query: 查询文本
-            products: 商品列表
+            products: 商品列表；传入时先用它重建索引，否则使用已维护的索引
             top_k: 返回数量
             
         Returns:
             list: [(product_id, score), ...] 按分数排序
         """
-        if not products:
-            return []
+        return list(self.search_scores(query, products, top_k).items())
+    
+    def search_scores(self, query, products=None, top_k=10):
+        """
+        执行语义搜索，返回按分数从高到低排列的 {product_id: score}
+        
+        只对与扩展查询词至少共享一个词的候选商品计算相似度，
+        再用堆取出前 top_k 个，无需对全部打分结果排序。
+        """
+        if products is not None:
+            self.build_index(products)
         
         # 扩展查询词
-        expanded_queries = self.expand_query(query)
+        expanded_queries = list({term.lower() for term in self.expand_query(query)})
+        query_tokens = {term: self.tokenize(term) for term in expanded_queries}
         
         results = []
         
-        for product in products:
-            # 组合商品信息
-            product_text = f"{product.name} {product.description}"
+        with self._lock:
+            if not self.documents:
+                return {}
             
-            max_score = 0
+            # 通过倒排索引找出候选商品
+            candidates = set()
+            for tokens in query_tokens.values():
+                for term in self.index_terms(tokens):
+                    candidates.update(self.postings.get(term, ()))
             
-            # 对每个扩展查询词计算相似度
-            for expanded_query in expanded_queries:
-                score = self.calculate_similarity(expanded_query, product_text)
-                max_score = max(max_score, score)
-            
-            # 如果包含关键词，额外加分
-            for expanded_query in expanded_queries:
-                if expanded_query.lower() in product_text.lower():
-                    max_score += 0.2
-            
-            if max_score > 0.1:  # 只返回相关度较高的结果
-                results.append((product.id, min(max_score, 1.0)))
+            for product_id in candidates:
+                document = self.documents[product_id]
+                product_text = document['text']
+                
+                max_score = 0
+                
+                # 对每个扩展查询词计算相似度
+                for expanded_query, tokens in query_tokens.items():
+                    score = self.score_document(expanded_query, tokens, document)
+                    max_score = max(max_score, score)
+                
+                # 如果包含关键词，额外加分
+                for expanded_query in expanded_queries:
+                    if expanded_query in product_text:
+                        max_score += 0.2
+                
+                if max_score > 0.1:  # 只返回相关度较高的结果
+                    results.append((product_id, min(max_score, 1.0)))
+        
+        # 取分数最高的 top_k 个
+        return dict(heapq.nlargest(top_k, results, key=lambda x: x[1]))
+    
+    def score_document(self, term, term_tokens, document):
+        """使用索引中预先分好的词计算查询词与商品的相似度，算法同 calculate_similarity"""
+        similarity1 = SequenceMatcher(None, term, document['text']).ratio()
         
-        # 按分数排序
-        results.sort(key=lambda x: x[1], reverse=True)
+        words2 = document['tokens']
+        if len(term_tokens) == 0 or len(words2) == 0:
+            similarity2 = 0
+        else:
+            intersection = len(term_tokens & words2)
+            union = len(term_tokens | words2)
+            similarity2 = intersection / union if union > 0 else 0
         
-        return results[:top_k]
+        return max(similarity1, similarity2)
 
 
-# 全局实例
-_simple_search = SimpleSemanticSearch()
+# 全局实例，第一次使用时才创建
+_simple_search = None
+_simple_search_lock = threading.Lock()
 
 def get_simple_search():
     """获取简单语义搜索实例"""
+    global _simple_search
+    if _simple_search is None:
+        with _simple_search_lock:
+            if _simple_search is None:
+                with timed('simple_search'):
+                    _simple_search = SimpleSemanticSearch()
     return _simple_search
\ No newline at end of file
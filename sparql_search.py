@@ -3,16 +3,18 @@ SPARQL语义搜索服务
 基于知识库进行智能搜索和推理
 """
 
-from knowledge_base import knowledge_base
+from knowledge_base import get_knowledge_base
+from startup import timed
 import jieba
 import re
+import threading
 
 class SPARQLSemanticSearch:
     """SPARQL语义搜索服务类"""
     
     def __init__(self):
-        self.kb = knowledge_base
-        self.g = knowledge_base.g
+        self.kb = get_knowledge_base()
+        self.g = self.kb.g
     
     def semantic_search(self, query_text, limit=20):
         """
@@ -60,34 +62,23 @@ class SPARQLSemanticSearch:
         if not query_words:
             return []
         
-        # 构建SPARQL过滤条件
-        title_filters = []
-        desc_filters = []
-        keyword_filters = []
-        
-        for word in query_words:
-            title_filters.append(f'CONTAINS(LCASE(str(?title)), "{word}")')
-            desc_filters.append(f'CONTAINS(LCASE(str(?description)), "{word}")')
-            keyword_filters.append(f'CONTAINS(LCASE(str(?keyword)), "{word}")')
+        # 先通过字面量索引找出候选书籍，SPARQL只取这些书籍的属性
+        book_uris = self.kb.literal_index.find_books(query_words, ('title', 'description', 'keyword'))
+        if not book_uris:
+            return []
         
         sparql_query = f"""
         PREFIX wb: <http://webook.com/ontology#>
         
         SELECT DISTINCT ?book ?title ?description ?price ?condition
         WHERE {{
+            {self.values_clause(book_uris)}
             ?book a wb:Book ;
                   wb:hasTitle ?title ;
                   wb:hasPrice ?price .
             
             OPTIONAL {{ ?book wb:hasDescription ?description }}
             OPTIONAL {{ ?book wb:hasCondition ?condition }}
-            OPTIONAL {{ ?book wb:hasKeyword ?keyword }}
-            
-            FILTER (
-                {' || '.join(title_filters)} ||
-                {' || '.join(desc_filters)} ||
-                {' || '.join(keyword_filters)}
-            )
         }}
         ORDER BY ?title
         LIMIT {limit}
@@ -104,31 +95,24 @@ class SPARQLSemanticSearch:
         if not expanded_terms:
             return []
         
-        # 构建扩展搜索的SPARQL查询
-        filters = []
-        for term in expanded_terms:
-            filters.extend([
-                f'CONTAINS(LCASE(str(?title)), "{term}")',
-                f'CONTAINS(LCASE(str(?description)), "{term}")',
-                f'CONTAINS(LCASE(str(?keyword)), "{term}")'
-            ])
+        book_uris = self.kb.literal_index.find_books(expanded_terms, ('title', 'description', 'keyword'))
+        if not book_uris:
+            return []
         
         sparql_query = f"""
         PREFIX wb: <http://webook.com/ontology#>
         
         SELECT DISTINCT ?book ?title ?description ?price ?condition ?language ?difficulty
         WHERE {{
+            {self.values_clause(book_uris)}
             ?book a wb:Book ;
                   wb:hasTitle ?title ;
                   wb:hasPrice ?price .
             
             OPTIONAL {{ ?book wb:hasDescription ?description }}
             OPTIONAL {{ ?book wb:hasCondition ?condition }}
-            OPTIONAL {{ ?book wb:hasKeyword ?keyword }}
             OPTIONAL {{ ?book wb:hasLanguage ?language }}
             OPTIONAL {{ ?book wb:hasDifficulty ?difficulty }}
-            
-            FILTER ({' || '.join(filters[:50])})  # 限制过滤条件数量避免查询过大
         }}
         ORDER BY ?title
         LIMIT {limit}
@@ -191,24 +175,22 @@ class SPARQLSemanticSearch:
         if not tech_terms:
             return []
         
-        filters = []
-        for term in tech_terms:
-            filters.append(f'CONTAINS(LCASE(str(?language)), "{term}") || CONTAINS(LCASE(str(?keyword)), "{term}")')
+        book_uris = self.kb.literal_index.find_books(tech_terms, ('language', 'keyword'))
+        if not book_uris:
+            return []
         
         sparql_query = f"""
         PREFIX wb: <http://webook.com/ontology#>
         
         SELECT DISTINCT ?book ?title ?description ?price ?language
         WHERE {{
+            {self.values_clause(book_uris)}
             ?book a wb:Book ;
                   wb:hasTitle ?title ;
                   wb:hasPrice ?price .
             
             OPTIONAL {{ ?book wb:hasDescription ?description }}
             OPTIONAL {{ ?book wb:hasLanguage ?language }}
-            OPTIONAL {{ ?book wb:hasKeyword ?keyword }}
-            
-            FILTER ({' || '.join(filters)})
         }}
         ORDER BY ?language ?title
         LIMIT {limit}
@@ -216,6 +198,10 @@ class SPARQLSemanticSearch:
         
         return self.execute_sparql_query(sparql_query)
     
+    def values_clause(self, book_uris):
+        """把候选书籍URI拼成 VALUES 子句，限定SPARQL只访问这些书籍"""
+        return 'VALUES ?book { ' + ' '.join(f'<{uri}>' for uri in sorted(book_uris)) + ' }'
+    
     def preprocess_query(self, query):
         """预处理查询文本"""
         query_lower = query.lower().strip()
@@ -351,22 +337,23 @@ class SPARQLSemanticSearch:
         """根据书籍ID获取相关推荐"""
         sparql_query = f"""
         PREFIX wb: <http://webook.com/ontology#>
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
         
-        SELECT DISTINCT ?relatedBook ?title ?price ?category
+        SELECT DISTINCT ?book ?title ?price ?categoryLabel
         WHERE {{
             # 获取目标书籍的分类
             <http://webook.com/resource/book/{book_id}> wb:belongsToCategory ?sharedCategory .
             
             # 查找同分类的其他书籍
-            ?relatedBook a wb:Book ;
-                        wb:hasTitle ?title ;
-                        wb:hasPrice ?price ;
-                        wb:belongsToCategory ?sharedCategory .
+            ?book a wb:Book ;
+                  wb:hasTitle ?title ;
+                  wb:hasPrice ?price ;
+                  wb:belongsToCategory ?sharedCategory .
             
-            OPTIONAL {{ ?sharedCategory rdfs:label ?category }}
+            OPTIONAL {{ ?sharedCategory rdfs:label ?categoryLabel }}
             
             # 排除自己
-            FILTER (?relatedBook != <http://webook.com/resource/book/{book_id}>)
+            FILTER (?book != <http://webook.com/resource/book/{book_id}>)
         }}
         ORDER BY ?price
         LIMIT {limit}
@@ -374,22 +361,20 @@ class SPARQLSemanticSearch:
         
         return self.execute_sparql_query(sparql_query)
     
-    def get_search_suggestions(self, partial_query):
-        """根据部分查询获取搜索建议"""
-        suggestions = []
-        partial_lower = partial_query.lower()
-        
-        # 从同义词中提取建议
-        for main_term, synonyms in self.kb.synonyms.items():
-            if partial_lower in main_term or any(partial_lower in syn for syn in synonyms):
-                suggestions.extend([main_term] + synonyms[:2])
-        
-        # 从分类中提取建议
-        for category, keywords in self.kb.category_keywords.items():
-            if any(partial_lower in keyword for keyword in keywords):
-                suggestions.extend(keywords[:3])
-        
-        return list(set(suggestions))[:10]  # 返回前10个建议
+    def get_search_suggestions(self, partial_query, limit=10):
+        """根据部分查询获取搜索建议（同义词、分类关键词、书名和书籍关键词），按热度和书籍数排序"""
+        return self.kb.suggestion_index.suggest(partial_query, limit)
+
+# 全局搜索服务实例，第一次使用时才创建
+_semantic_search_service = None
+_semantic_search_lock = threading.Lock()
 
-# 创建全局搜索服务实例
-semantic_search_service = SPARQLSemanticSearch()
\ No newline at end of file
+def get_semantic_search_service():
+    """获取SPARQL语义搜索服务实例"""
+    global _semantic_search_service
+    if _semantic_search_service is None:
+        with _semantic_search_lock:
+            if _semantic_search_service is None:
+                with timed('semantic_search_service'):
+                    _semantic_search_service = SPARQLSemanticSearch()
+    return _semantic_search_service
@@ -0,0 +1,75 @@
+"""
+启动耗时统计与后台预热
+检索引擎、jieba 词典等在第一次使用时才初始化，这里记录各部分的初始化耗时，
+并可在后台线程中提前初始化，避免第一个用户请求等待
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import jieba
+
+_process_started_at = time.time()
+_report = {}
+_report_lock = threading.Lock()
+_jieba_lock = threading.Lock()
+
+
+@contextmanager
+def timed(name):
+    """记录一段初始化代码的耗时"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _report_lock:
+            _report[name] = {
+                'seconds': round(time.perf_counter() - started, 4),
+                'since_process_start': round(time.time() - _process_started_at, 4),
+                'thread': threading.current_thread().name
+            }
+
+
+def init_jieba():
+    """加载 jieba 词典（只加载一次）"""
+    with _jieba_lock:
+        if jieba.dt.initialized:
+            return
+        with timed('jieba'):
+            jieba.initialize()
+
+
+def prewarm(tasks, background=True):
+    """
+    依次执行初始化任务
+
+    Args:
+        tasks: [(名称, 无参函数), ...]
+        background: 为 True 时在后台守护线程中执行，立即返回
+    """
+    def run():
+        with timed('prewarm'):
+            for name, task in tasks:
+                try:
+                    task()
+                except Exception as e:
+                    print(f"[ERROR] 预热 {name} 失败: {e}")
+        print(f"[OK] 检索引擎预热完成，用时 {_report['prewarm']['seconds']} 秒")
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name='search-prewarm', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_startup_report():
+    """获取启动耗时报告"""
+    with _report_lock:
+        components = {name: dict(info) for name, info in _report.items()}
+    return {
+        'uptime_seconds': round(time.time() - _process_started_at, 4),
+        'jieba_initialized': bool(jieba.dt.initialized),
+        'components': components
+    }
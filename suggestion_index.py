@@ -0,0 +1,315 @@
+"""
+搜索建议前缀索引
+把同义词、分类关键词、书名和书籍关键词（hasKeyword）的匹配键存入有序数组，
+输入前缀时用二分查找定位匹配区间，再用建在数组上的线段树按权重取出前几条：
+- 权重 = 词表基础分 + 引用该词的书籍数 + 该词被搜索的次数（后两项取对数），权重相同时短词在前
+- 权重变化只更新线段树上对应的叶子；新增的词先放在一个小的有序缓冲区，积累较多后再整体归并
+"""
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from token_cache import get_token_cache
+from search_cache import normalize_query
+
+# 比任何字符都大的哨兵，前缀 p 的匹配区间是 [p, p + _MAX_CHAR)
+_MAX_CHAR = '\U0010ffff'
+# 已失效的词在线段树中的排序键，排在所有有效的词之后
+_MISSING = (math.inf, 0, '')
+
+
+class QueryPopularity:
+    """搜索词热度计数，超出容量时丢弃较冷的一半"""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.counts = Counter()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """热度变化时回调 callback(规范化的搜索词)；批量淘汰时参数为 None"""
+        self._listeners.append(callback)
+
+    def record(self, query):
+        query = normalize_query(query)
+        if not query:
+            return
+        with self._lock:
+            self.counts[query] += 1
+            pruned = len(self.counts) > self.max_size
+            if pruned:
+                self.counts = Counter(dict(self.counts.most_common(self.max_size // 2)))
+        for callback in self._listeners:
+            callback(None if pruned else query)
+
+    def get(self, term):
+        return self.counts.get(term, 0)
+
+
+# 全局搜索词热度，search() 每次搜索时记录
+query_popularity = QueryPopularity()
+
+
+class SuggestionIndex:
+    """基于有序数组、二分查找和线段树的搜索建议索引"""
+
+    def __init__(self, popularity=query_popularity, short_term_length=12, merge_threshold=1000):
+        self.popularity = popularity
+        # 不超过这个长度的词（关键词等）可从任意位置开始匹配，与原来的子串匹配一致；
+        # 更长的词（书名）只从分词边界开始匹配
+        self.short_term_length = short_term_length
+        # 缓冲区超过这么多条时，下次查询前整体归并
+        self.merge_threshold = merge_threshold
+
+        # 有序匹配键及对应的建议词（两个列表一一对应），以及建议词在其中的位置
+        self._keys = []
+        self._terms = []
+        self._positions = {}
+        # 线段树：_tree[_size + i] 是第 i 个匹配键对应建议词的排序键 (-权重, 词长, 词)，
+        # 内部节点取子节点中较小的，即区间内排在最前的词
+        self._size = 1
+        self._tree = [_MISSING, _MISSING]
+        # 尚未归并的 (匹配键, 建议词)，未标记 _stale 时保持有序
+        self._pending = []
+        # 缓冲区中的建议词 -> 排序键
+        self._pending_terms = {}
+        # 有序数组中已失效（不再被引用）的建议词
+        self._dead_terms = set()
+        # 为 True 时下次查询前重建有序数组和线段树
+        self._stale = False
+        # 建议词 -> 规范化的词，以及反向映射（搜索热度变化时据此找到对应的建议词）
+        self._normalized = {}
+        self._by_query = {}
+
+        # 词表中的建议词 -> 基础分
+        self.vocabulary = {}
+        # 建议词 -> 引用它的书籍数
+        self.frequency = Counter()
+        # 书籍 -> 该书贡献的建议词
+        self.book_terms = {}
+        self._lock = threading.RLock()
+        popularity.subscribe(self._on_popularity)
+
+    def _match_keys(self, term):
+        text = normalize_query(term)
+        if not text:
+            return set()
+        if len(text) <= self.short_term_length:
+            starts = range(len(text) - 1)
+        else:
+            starts, position = [], 0
+            for token in get_token_cache().lcut(text):
+                if token.strip() and not re.fullmatch(r'[\W_]+', token):
+                    starts.append(position)
+                position += len(token)
+        keys = {text[start:] for start in starts if len(text) - start >= 2}
+        keys.add(text)
+        return keys
+
+    def _is_live(self, term):
+        return term in self.vocabulary or self.frequency.get(term, 0) > 0
+
+    def weight(self, term):
+        return (self.vocabulary.get(term, 0)
+                + math.log1p(self.frequency.get(term, 0))
+                + 2 * math.log1p(self.popularity.get(self._normalized.get(term) or normalize_query(term))))
+
+    def _sort_key(self, term):
+        if not self._is_live(term):
+            return _MISSING
+        return (-self.weight(term), len(term), term)
+
+    def _set_leaf(self, position, sort_key):
+        node = self._size + position
+        self._tree[node] = sort_key
+        node //= 2
+        while node:
+            best = min(self._tree[2 * node], self._tree[2 * node + 1])
+            if self._tree[node] == best:
+                break
+            self._tree[node] = best
+            node //= 2
+
+    def _update_term(self, term):
+        """建议词的权重或存活状态变化后更新线段树"""
+        if term in self._pending_terms:
+            self._pending_terms[term] = self._sort_key(term)
+            return
+        positions = self._positions.get(term)
+        if not positions or self._stale:
+            return
+        sort_key = self._sort_key(term)
+        for position in positions:
+            self._set_leaf(position, sort_key)
+        if sort_key == _MISSING:
+            self._dead_terms.add(term)
+            if len(self._dead_terms) * 4 > len(self._positions):
+                self._stale = True
+        else:
+            self._dead_terms.discard(term)
+
+    def _reference(self, term):
+        """建议词被引用（或权重变化）时调用"""
+        if term in self._positions or term in self._pending_terms:
+            self._update_term(term)
+            return
+        normalized = self._normalized[term] = normalize_query(term)
+        self._by_query.setdefault(normalized, set()).add(term)
+        for key in self._match_keys(term):
+            if self._stale:
+                self._pending.append((key, term))
+            else:
+                insort(self._pending, (key, term))
+        # 缓冲区相对有序数组足够大时才归并，使归并的开销分摊到每次新增上
+        self._pending_terms[term] = self._sort_key(term)
+        if len(self._pending) > max(self.merge_threshold, len(self._keys) // 32):
+            self._stale = True
+
+    def _release(self, term):
+        """建议词不再被引用时调用"""
+        if self._is_live(term):
+            self._reference(term)
+            return
+        if term in self._pending_terms:
+            del self._pending_terms[term]
+            self._pending = [pair for pair in self._pending if pair[1] != term]
+            return
+        self._update_term(term)
+
+    def add_vocabulary(self, terms, weight=1.0):
+        """加入词表（同义词、分类关键词等），已存在的取较高的基础分"""
+        with self._lock:
+            for term in terms:
+                self.vocabulary[term] = max(weight, self.vocabulary.get(term, 0))
+                self._reference(term)
+
+    def set_book(self, book, terms):
+        """设置某本书贡献的建议词（书名、关键词），替换之前的"""
+        terms = {term for term in terms if term and term.strip()}
+        with self._lock:
+            old_terms = self.book_terms.pop(book, set())
+            if terms:
+                self.book_terms[book] = terms
+            for term in terms - old_terms:
+                self.frequency[term] += 1
+                self._reference(term)
+            for term in old_terms - terms:
+                self.frequency[term] -= 1
+                if self.frequency[term] <= 0:
+                    del self.frequency[term]
+                self._release(term)
+
+    def remove_book(self, book):
+        self.set_book(book, ())
+
+    def clear_books(self):
+        """移除全部书籍贡献的建议词，保留词表"""
+        with self._lock:
+            self.book_terms = {}
+            self.frequency = Counter()
+            self._stale = True
+
+    def _on_popularity(self, query):
+        with self._lock:
+            if query is None:
+                # 大量热度被淘汰，下次查询前整体重算权重
+                self._stale = True
+                return
+            for term in self._by_query.get(query, ()):
+                self._update_term(term)
+
+    def _merge(self):
+        """把缓冲区归并进有序数组，清理失效的词，并重建线段树"""
+        live = {term for term in self._positions if self._is_live(term)}
+        live.update(term for term in self._pending_terms if self._is_live(term))
+        pairs = [pair for pair in zip(self._keys, self._terms) if pair[1] in live]
+        # 两段各自有序，timsort 归并只需线性时间
+        pairs.extend(sorted(pair for pair in self._pending if pair[1] in live))
+        pairs.sort()
+        self._keys = [key for key, term in pairs]
+        self._terms = [term for key, term in pairs]
+        self._pending = []
+        self._pending_terms = {}
+        self._dead_terms = set()
+
+        self._positions = {}
+        for position, term in enumerate(self._terms):
+            self._positions.setdefault(term, []).append(position)
+        self._normalized = {term: self._normalized.get(term) or normalize_query(term) for term in self._positions}
+        self._by_query = {}
+        sort_keys = {}
+        for term, normalized in self._normalized.items():
+            self._by_query.setdefault(normalized, set()).add(term)
+            sort_keys[term] = self._sort_key(term)
+
+        self._size = 1
+        while self._size < len(self._terms):
+            self._size *= 2
+        tree = [_MISSING] * (2 * self._size)
+        tree[self._size:self._size + len(self._terms)] = map(sort_keys.__getitem__, self._terms)
+        for node in range(self._size - 1, 0, -1):
+            tree[node] = min(tree[2 * node], tree[2 * node + 1])
+        self._tree = tree
+        self._stale = False
+
+    def suggest(self, prefix, limit=10):
+        """
+        按前缀返回权重最高的建议词
+
+        Returns:
+            list: 建议词，权重相同时短词在前
+        """
+        prefix = normalize_query(prefix)
+        if not prefix or limit <= 0:
+            return []
+        with self._lock:
+            if self._stale:
+                self._merge()
+            tree, size = self._tree, self._size
+
+            # 堆中元素为 (排序键, 线段树节点)；内部节点的排序键等于其区间内排在最前的词，
+            # 因此按堆顺序展开时，词也按排序键依次弹出。节点为 -1 表示缓冲区中的词
+            heap = []
+
+            # 把匹配区间 [start, end) 分解为 O(log n) 个线段树节点
+            left = bisect_left(self._keys, prefix) + size
+            right = bisect_left(self._keys, prefix + _MAX_CHAR) + size
+            while left < right:
+                if left & 1:
+                    heap.append((tree[left], left))
+                    left += 1
+                if right & 1:
+                    right -= 1
+                    heap.append((tree[right], right))
+                left //= 2
+                right //= 2
+
+            # 缓冲区中尚未归并的词
+            pending_keys = {}
+            for i in range(bisect_left(self._pending, (prefix,)), len(self._pending)):
+                key, term = self._pending[i]
+                if not key.startswith(prefix):
+                    break
+                pending_keys[term] = self._pending_terms[term]
+            heap.extend((sort_key, -1) for sort_key in heapq.nsmallest(limit, pending_keys.values()))
+
+            heapq.heapify(heap)
+            results, seen = [], set()
+            while heap and len(results) < limit:
+                sort_key, node = heapq.heappop(heap)
+                if sort_key == _MISSING:
+                    # 剩下的都是已失效的词
+                    break
+                if node < 0 or node >= size:
+                    term = sort_key[2]
+                    if term not in seen:
+                        seen.add(term)
+                        results.append(term)
+                    continue
+                heapq.heappush(heap, (tree[2 * node], 2 * node))
+                heapq.heappush(heap, (tree[2 * node + 1], 2 * node + 1))
+        return results
@@ -0,0 +1,41 @@
+"""
+测试公共配置
+导入任何应用模块之前，把会写文件的配置都指向临时目录，并使用确定性的哈希编码器，测试不依赖模型下载
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+_TMP_DIR = tempfile.mkdtemp(prefix='webook-tests-')
+atexit.register(shutil.rmtree, _TMP_DIR, ignore_errors=True)
+os.environ.update({
+    'EMBEDDING_BACKEND': 'hashing',
+    'VECTOR_DIM': '64',
+    'FAISS_INDEX_PATH': os.path.join(_TMP_DIR, 'faiss_index.bin'),
+    'KB_STORE_DIR': os.path.join(_TMP_DIR, 'knowledge_base'),
+    'JOB_QUEUE_PATH': os.path.join(_TMP_DIR, 'jobs.db'),
+    'CHANGE_LOG_PATH': os.path.join(_TMP_DIR, 'changes.db'),
+    'SEARCH_CACHE_PATH': '',
+    'SEARCH_PREWARM': 'false',
+})
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def make_product(product_id, name, description=''):
+    """检索索引只读取商品的 id、name、description"""
+    return SimpleNamespace(id=product_id, name=name, description=description)
+
+
+@pytest.fixture
+def products():
+    return [
+        make_product(1, 'Python编程从入门到实践', 'Python 入门教程，包含项目实战'),
+        make_product(2, '深度学习入门', '神经网络与机器学习基础'),
+        make_product(3, '算法导论', '经典数据结构与算法教材'),
+        make_product(4, 'Java核心技术', 'Java 编程进阶'),
+    ]
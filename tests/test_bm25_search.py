@@ -0,0 +1,55 @@
+import pytest
+
+from bm25_search import BM25Search
+from conftest import make_product
+
+
+@pytest.fixture
+def engine(products):
+    engine = BM25Search()
+    engine.build_index(products)
+    return engine
+
+
+def test_ranks_the_best_match_first(engine):
+    scores = engine.search_scores('python 入门', top_k=10)
+    assert list(scores)[0] == 1
+    assert list(scores.values()) == sorted(scores.values(), reverse=True)
+
+
+def test_top_k_limits_results(engine):
+    assert len(engine.search_scores('入门', top_k=10)) == 2
+    assert len(engine.search_scores('入门', top_k=1)) == 1
+
+
+@pytest.mark.parametrize('top_k', [0, -1])
+def test_non_positive_top_k_returns_nothing(engine, top_k):
+    assert engine.search_scores('入门', top_k=top_k) == {}
+
+
+def test_incremental_updates_match_a_full_rebuild(products):
+    engine = BM25Search(merge_min_rows=1)
+    engine.build_index(products)
+    changed = make_product(3, '算法图解', 'Python 算法入门')
+    added = make_product(5, 'Python数据分析', 'pandas 入门')
+    for product in (changed, added):
+        engine.index_product(product)
+    engine.remove_product(2)
+    incremental = engine.search_scores('python 入门', top_k=10)
+
+    rebuilt = BM25Search()
+    rebuilt.build_index([products[0], changed, products[3], added])
+    expected = rebuilt.search_scores('python 入门', top_k=10)
+
+    assert set(incremental) == set(expected)
+    assert {3, 5} <= set(incremental)
+    assert list(incremental)[0] == list(expected)[0]
+    assert 2 not in engine.search_scores('深度学习', top_k=10)
+
+
+def test_empty_index_returns_nothing():
+    engine = BM25Search()
+    assert engine.search_scores('python') == {}
+    engine.build_index([])
+    engine.index_product(make_product(1, 'Python 入门'))
+    assert list(engine.search_scores('python')) == [1]
@@ -0,0 +1,45 @@
+import change_tracker as change_tracker_module
+from change_tracker import ProductChangeTracker
+
+
+def test_pending_starts_with_a_full_sync_then_returns_marked_ids():
+    tracker = ProductChangeTracker()
+    assert tracker.pending('bm25') is None
+    tracker.mark_many([1, 2])
+    assert tracker.pending('bm25') == {1, 2}
+    assert tracker.pending('bm25') == set()
+
+
+def test_changes_from_other_processes_are_pulled(tmp_path, monkeypatch):
+    path = str(tmp_path / 'changes.db')
+    reader = ProductChangeTracker(path)
+    assert reader.pending('bm25') is None
+
+    writer = ProductChangeTracker(path)
+    monkeypatch.setattr(change_tracker_module.os, 'getpid', lambda: -1)
+    writer.mark_many([7, 8])
+    monkeypatch.undo()
+
+    assert reader.pending('bm25') == {7, 8}
+    # 本进程自己记录的变更不会再从日志中读一遍
+    reader.mark(9)
+    assert reader.pending('bm25') == {9}
+
+
+def test_subscribers_are_notified_of_remote_changes_only(tmp_path, monkeypatch):
+    path = str(tmp_path / 'changes.db')
+    reader = ProductChangeTracker(path)
+    notified = []
+    reader.subscribe(notified.append)
+    reader.poll()
+
+    writer = ProductChangeTracker(path)
+    monkeypatch.setattr(change_tracker_module.os, 'getpid', lambda: -1)
+    writer.mark_many([7])
+    monkeypatch.undo()
+    reader.mark(9)
+
+    reader.poll()
+    assert notified == [{7}]
+    reader.poll()
+    assert notified == [{7}]
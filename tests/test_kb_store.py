@@ -0,0 +1,61 @@
+import os
+
+from rdflib.namespace import RDF
+
+from kb_store import KnowledgeBaseStore
+from knowledge_base import WeBookKnowledgeBase
+
+
+def book_data(product):
+    return {'id': product.id, 'name': product.name, 'description': product.description,
+            'price': 10.0, 'degree_of_wear': 'good'}
+
+
+def open_kb(directory):
+    kb = WeBookKnowledgeBase()
+    kb.attach_store(KnowledgeBaseStore(str(directory)))
+    return kb
+
+
+def test_first_full_sync_writes_a_snapshot(tmp_path, products):
+    kb = open_kb(tmp_path)
+    kb.reconcile_books([book_data(product) for product in products])
+    kb.store.compact(kb)
+    assert os.path.exists(kb.store.snapshot_path)
+
+
+def test_warm_start_loads_snapshot_without_reanalysis(tmp_path, products, monkeypatch):
+    kb = open_kb(tmp_path)
+    kb.reconcile_books([book_data(product) for product in products])
+    kb.store.compact(kb)
+    triples = set(kb.get_book_triples())
+
+    # 启动时只加载快照中的三元组，不应重新分析书籍
+    def fail(self, book_uri, book_data):
+        raise AssertionError(f"书籍 {book_data['id']} 被重新分析")
+    monkeypatch.setattr(WeBookKnowledgeBase, 'analyze_and_enrich_book', fail)
+
+    warm = open_kb(tmp_path)
+    assert len(set(warm.g.subjects(RDF.type, warm.WB.Book))) == len(products)
+    assert set(warm.get_book_triples()) == triples
+    assert warm.fingerprints == kb.fingerprints
+
+    # 数据未变的全量核对不写日志，也不需要新快照
+    warm.reconcile_books([book_data(product) for product in products])
+    assert warm.store._entries_since_snapshot == 0
+
+
+def test_changes_after_the_snapshot_are_replayed(tmp_path, products):
+    kb = open_kb(tmp_path)
+    kb.reconcile_books([book_data(product) for product in products])
+    kb.store.compact(kb)
+    kb.remove_book_from_kb(products[0].id)
+
+    warm = open_kb(tmp_path)
+    assert len(set(warm.g.subjects(RDF.type, warm.WB.Book))) == len(products) - 1
+    assert str(products[0].id) not in warm.fingerprints
+
+    # 其他进程写入的变更通过 catch_up 读到
+    kb.upsert_book_to_kb(book_data(products[0]))
+    warm.store.catch_up(warm)
+    assert len(set(warm.g.subjects(RDF.type, warm.WB.Book))) == len(products)
@@ -0,0 +1,41 @@
+from search_cache import SearchCache, normalize_query
+
+
+def test_normalize_query_folds_width_case_and_whitespace():
+    assert normalize_query('  ＰＹＴＨＯＮ\t 编程  ') == 'python 编程'
+    assert normalize_query('Python 编程') == 'python 编程'
+
+
+def test_equivalent_queries_share_one_cache_key():
+    cache = SearchCache()
+    assert cache.make_key('keyword', 'ＰＹＴＨＯＮ  编程', None) == cache.make_key('keyword', 'python 编程', None)
+    assert cache.make_key('bm25', 'python', 10) != cache.make_key('bm25', 'python', 20)
+
+
+def test_get_or_compute_caches_until_version_bump():
+    cache = SearchCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return [[1, 0.5]]
+
+    assert cache.get_or_compute('bm25', 'Python', 10, compute) == [[1, 0.5]]
+    assert cache.get_or_compute('bm25', ' python ', 10, compute) == [[1, 0.5]]
+    assert len(calls) == 1
+
+    cache.bump_version()
+    cache.get_or_compute('bm25', 'python', 10, compute)
+    assert len(calls) == 2
+
+
+def test_process_local_results_stay_out_of_shared_tier(tmp_path):
+    shared_path = str(tmp_path / 'search_cache.db')
+    writer = SearchCache(shared_path=shared_path)
+    writer.get_or_compute('bm25', 'python', 10, lambda: [[1, 0.5]], shared=False)
+    writer.get_or_compute('keyword', 'python', None, lambda: [[2, None]])
+
+    reader = SearchCache(shared_path=shared_path)
+    version = reader.current_version()
+    assert reader.get(reader.make_key('bm25', 'python', 10), version) is None
+    assert reader.get(reader.make_key('keyword', 'python', None), version) == [[2, None]]
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip('faiss')
+
+from conftest import make_product
+from semantic_search import HashingEmbedder, VectorSearchService
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / 'faiss_index.bin')
+
+
+def open_service(index_path):
+    return VectorSearchService(index_path, embedder_factory=lambda: HashingEmbedder(64))
+
+
+def test_upsert_and_remove(index_path, products):
+    service = open_service(index_path)
+    assert service.available
+    service.reconcile(products)
+    assert list(service.search_scores('深度学习 入门', top_k=1)) == [2]
+
+    service.index_product(make_product(2, 'Java核心技术 卷二', 'Java 编程进阶'))
+    assert 2 not in service.search_scores('深度学习 入门', top_k=4)
+    assert service.index.ntotal == len(products)
+
+    service.remove_product(4)
+    assert service.index.ntotal == len(products) - 1
+    assert 4 not in service.search_scores('Java 编程进阶', top_k=4)
+
+
+def test_unchanged_products_are_not_reencoded(index_path, products):
+    service = open_service(index_path)
+    service.reconcile(products)
+
+    encoded = []
+    encode = service.embedder.encode
+    service.embedder.encode = lambda texts, batch_size=64: encoded.extend(texts) or encode(texts, batch_size)
+    service.reconcile(products)
+    service.index_product(products[0])
+    assert encoded == []
+
+
+def test_other_processes_see_the_published_index(index_path, products):
+    writer = open_service(index_path)
+    reader = open_service(index_path)
+    writer.reconcile(products)
+    assert list(reader.search_scores('算法导论', top_k=1)) == [3]
+
+    writer.remove_product(3)
+    assert 3 not in reader.search_scores('算法导论', top_k=4)
@@ -0,0 +1,74 @@
+"""
+分词缓存模块
+按商品ID和文本内容哈希缓存 jieba 分词结果，供语义搜索和知识库共用
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import jieba
+
+from config import Config
+
+
+class TokenCache:
+    """带LRU淘汰和容量上限的分词缓存"""
+
+    def __init__(self, max_size=5000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lcut(self, text, key=None):
+        """
+        分词，命中缓存时直接返回
+
+        Args:
+            text: 要分词的文本
+            key: 文本所属对象的标识（如商品ID）；内容变化后哈希不同，自动按新内容重新分词
+
+        Returns:
+            tuple: 分词结果
+        """
+        cache_key = (key, hashlib.sha1(text.encode('utf-8')).hexdigest())
+        with self._lock:
+            tokens = self._entries.get(cache_key)
+            if tokens is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return tokens
+            self.misses += 1
+
+        tokens = tuple(jieba.lcut(text))
+
+        with self._lock:
+            self._entries[cache_key] = tokens
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return tokens
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+# 全局实例
+_token_cache = TokenCache(max_size=Config.TOKEN_CACHE_SIZE)
+
+def get_token_cache():
+    """获取分词缓存实例"""
+    return _token_cache